@@ -1,9 +1,110 @@
 import base64
+import io
 import numpy as np
 import cv2
+from PIL import Image
+from typing import AsyncIterable, Optional, Tuple
 
+Buffer = bytes | bytearray | memoryview
 
-def base64_to_img(encoded_data: str) -> cv2.Mat:
-    nparr = np.frombuffer(base64.b64decode(encoded_data), np.uint8)
+# JPEG headers (including EXIF) fit here, so the size can be read without decoding.
+HEADER_PEEK_BYTES = 256 * 1024
+
+REDUCED_MODES = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+class BodyTooLarge(ValueError):
+    pass
+
+
+def base64_to_bytes(encoded_data: str) -> bytes:
+    return base64.b64decode(encoded_data)
+
+
+def bytes_to_img(buffer: Buffer) -> cv2.Mat:
+    # np.frombuffer only wraps the buffer, the only copy is the decoded matrix.
+    nparr = np.frombuffer(buffer, np.uint8)
     img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
     return img
+
+
+def base64_to_img(encoded_data: str) -> cv2.Mat:
+    return bytes_to_img(base64_to_bytes(encoded_data))
+
+
+def read_image_size(buffer: Buffer) -> Optional[Tuple[int, int]]:
+    """
+    Reads (width, height) from the image header, without decoding any pixel.
+    """
+    try:
+        with Image.open(io.BytesIO(buffer[:HEADER_PEEK_BYTES])) as image:
+            return image.size
+    except Exception:
+        return None
+
+
+def bytes_to_img_reduced(buffer: Buffer, min_side: int) -> Tuple[cv2.Mat, float]:
+    """
+    Decodes the image at the smallest power of two reduction (1/2, 1/4 or 1/8) that
+    keeps its shortest side at least `min_side` pixels.
+
+    JPEGs are downscaled in the DCT domain, so the full resolution matrix is never
+    built. Other formats are decoded and then downscaled by OpenCV, which still
+    saves every later copy and resize.
+
+    Returns the image and the factor that maps its coordinates back to the original.
+    """
+    size = read_image_size(buffer)
+    if size is None:
+        return bytes_to_img(buffer), 1.0
+
+    for factor, mode in REDUCED_MODES:
+        if min(size) // factor >= min_side:
+            img = cv2.imdecode(np.frombuffer(buffer, np.uint8), mode)
+            if img is None:
+                return img, 1.0
+            # EXIF rotation might have swapped the sides, so compare the longest ones.
+            return img, max(size) / max(img.shape[:2])
+
+    return bytes_to_img(buffer), 1.0
+
+
+async def read_stream(
+    stream: AsyncIterable[bytes],
+    content_length: Optional[int] = None,
+    max_size: Optional[int] = None,
+) -> memoryview:
+    """
+    Reads a body stream into a single buffer, copying every chunk exactly once.
+
+    When the length is known up front the buffer is allocated once, otherwise it grows.
+    Raises `BodyTooLarge` as soon as the body is known to exceed `max_size` bytes, so
+    no more than that is ever allocated.
+    """
+    if content_length is None:
+        buffer = bytearray()
+        async for chunk in stream:
+            if max_size is not None and len(buffer) + len(chunk) > max_size:
+                raise BodyTooLarge(f"The body is bigger than {max_size} bytes!")
+            buffer += chunk
+        return memoryview(buffer)
+
+    if content_length < 0:
+        raise ValueError("Invalid Content-Length!")
+    if max_size is not None and content_length > max_size:
+        raise BodyTooLarge(f"The body is bigger than {max_size} bytes!")
+
+    buffer = bytearray(content_length)
+    view = memoryview(buffer)
+    offset = 0
+    async for chunk in stream:
+        if offset + len(chunk) > content_length:
+            raise ValueError("The body is bigger than its Content-Length!")
+        view[offset : offset + len(chunk)] = chunk
+        offset += len(chunk)
+
+    return view[:offset]
@@ -1,6 +1,11 @@
+import asyncio
+import base64
+import json
+from contextlib import asynccontextmanager
 import cv2
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, Response
+import numpy as np
+from fastapi import FastAPI, Request, Depends, HTTPException
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
@@ -10,50 +15,167 @@ from models import (
     create_region,
     create_ecg_classifier,
     create_fracture,
+    ECGRequest,
+    FractureRequest,
+    prepare_for_models,
+    DEFAULT_INPUT_SIZE,
+    MODALITY_INPUT_SIZE,
+    ECG_INPUT_SIZE,
+    DETECTOR_INPUT_SIZE,
+    scale_detections,
+    AsyncStreamer,
+    load_engine_configs,
+    ResultCache,
+    digest_bytes,
 )
 
-from decode import base64_to_img
+from decode import (
+    base64_to_bytes,
+    bytes_to_img,
+    bytes_to_img_reduced,
+    read_stream,
+    BodyTooLarge,
+    Buffer,
+)
 from pydantic import BaseModel
-from typing import Dict, List
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional, Tuple
 from environment_loader import Environment
 
-from models.indexer.client import Qwen3OllamaClient, Qwen3OpenAiClient
-from models.indexer import index_texts, Keywords
+from models.indexer.client import PoolConfig, Qwen3OllamaClient, Qwen3OpenAiClient
+from models.indexer.matcher import RepairPolicy
+from models.indexer import (
+    index_texts,
+    stream_index_text,
+    Keywords,
+    CTakesBatcher,
+    CachedClient,
+    LLMCache,
+    TranslationMemory,
+    ConceptAnnotator,
+)
 
 
 class ModelInput(BaseModel):
     img: str
 
 
+class RadiographyInput(BaseModel):
+    img: str
+    fracture: bool = False
+    # The browser can draw the boxes itself, the PNG overlay is opt-in.
+    fracture_overlay: bool = False
+
+
 class IndexInput(BaseModel):
     text: str
     use_soap: bool
 
 
-CUDA_DEVICES = None  # (0,)
-BATCH_SIZE = 2
-MAX_LATENCY = 0.1
-WORKER_NUM = 1
+INFERENCE_TIMEOUT = 20
+DEFAULT_MAX_UPLOAD_BYTES = 64 * 1024 * 1024
+# Room for the boundaries and part headers of a multipart upload.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Documents the binary bodies accepted by the `/upload` variants.
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/octet-stream": {
+                "schema": {"type": "string", "format": "binary"}
+            },
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            },
+        },
+    }
+}
 
-multiple_diseases_streamer = create_diseases(
-    CUDA_DEVICES, BATCH_SIZE, MAX_LATENCY, WORKER_NUM
+env = Environment("env.json")
+engine_configs = load_engine_configs(env.get("engines", require=False))
+# Decode big images straight at the smallest resolution the target models need.
+reduced_decode = env.get("reduced_decode", True, require=False)
+# Bigger uploads are refused before anything is allocated for them. 0 or null
+# keeps the default, the cap can't be turned off.
+max_upload_bytes = (
+    env.get("max_upload_bytes", require=False) or DEFAULT_MAX_UPLOAD_BYTES
 )
+# Shared by every image endpoint, repeated uploads skip decoding and inference.
+result_cache = ResultCache(**(env.get("result_cache", require=False) or {}))
 
-ecg_classifier_streamer = create_ecg_classifier(
-    CUDA_DEVICES, BATCH_SIZE, MAX_LATENCY, WORKER_NUM
-)
+multiple_diseases_streamer = create_diseases(engine_configs["diseases"])
 
-modality_streamer = create_modality(CUDA_DEVICES, BATCH_SIZE, MAX_LATENCY, WORKER_NUM)
+ecg_classifier_streamer = create_ecg_classifier(engine_configs["ecg"])
 
-region_streamer = create_region(CUDA_DEVICES, BATCH_SIZE, MAX_LATENCY, WORKER_NUM)
+modality_streamer = create_modality(engine_configs["modality"])
 
-fracture_streamer = create_fracture(CUDA_DEVICES, BATCH_SIZE, MAX_LATENCY, WORKER_NUM)
+region_streamer = create_region(engine_configs["region"])
 
+fracture_streamer = create_fracture(engine_configs["fracture"])
+
+# Awaitable front-ends, so handlers don't hold a threadpool thread while waiting.
+multiple_diseases_engine = AsyncStreamer(multiple_diseases_streamer, INFERENCE_TIMEOUT)
+ecg_classifier_engine = AsyncStreamer(ecg_classifier_streamer, INFERENCE_TIMEOUT)
+modality_engine = AsyncStreamer(modality_streamer, INFERENCE_TIMEOUT)
+region_engine = AsyncStreamer(region_streamer, INFERENCE_TIMEOUT)
+fracture_engine = AsyncStreamer(fracture_streamer, INFERENCE_TIMEOUT)
+
+# One pooled, keep-alive connection set for every LLM call of the app.
+client = Qwen3OllamaClient(
+    pool=PoolConfig(**(env.get("llm_client", require=False) or {}))
+)
+# Templated reports repeat a lot, identical LLM requests are answered from disk.
+llm_cache_config = env.get("llm_cache", require=False) or {}
+llm_cache = None
+if llm_cache_config.get("enabled", False):
+    llm_cache = LLMCache(
+        **{
+            k: v
+            for k, v in llm_cache_config.items()
+            if k not in ("enabled", "deterministic")
+        }
+    )
+    client = CachedClient(
+        client, llm_cache, deterministic=llm_cache_config.get("deterministic", True)
+    )
+# Stock report sentences are translated once and then reused.
+memory_config = env.get("translation_memory", require=False) or {}
+translation_memory = (
+    TranslationMemory(**{k: v for k, v in memory_config.items() if k != "enabled"})
+    if memory_config.get("enabled", False)
+    else None
+)
+# Dictionary lookup without the JVM, for when cTAKES' other annotators aren't needed.
+annotator_config = env.get("concept_annotator", require=False) or {}
+concept_annotator = (
+    ConceptAnnotator(**{k: v for k, v in annotator_config.items() if k != "enabled"})
+    if annotator_config.get("enabled", False)
+    else None
+)
+# Concurrent /index calls share cTAKES runs instead of each starting its own.
+# The key is only required once cTAKES actually runs, like in the handlers.
+ctakes_batcher = CTakesBatcher(
+    "apache-ctakes-6.0.0-bin",
+    env.get("SNOMED_API_KEY", require=False),
+    **(env.get("ctakes_batching", require=False) or {}),
+)
+# Incomplete term matches are repaired by asking only for the missing terms.
+repair_policy = RepairPolicy(**(env.get("matching", require=False) or {}))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await client.aclose()
+    if translation_memory is not None:
+        translation_memory.close()
 
-env = Environment("env.json")
-client = Qwen3OllamaClient()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
@@ -83,53 +205,396 @@ def status():
     return {"status": "Service seems to be running!"}
 
 
-@app.post("/raio-x-doencas")
-def diseases(img: ModelInput) -> Dict[str, bool]:
-    decoded_img = base64_to_img(img.img)
-    output: Dict[str, bool] = multiple_diseases_streamer.predict([decoded_img])[0]
+def encode_png(img_matrix) -> bytes:
+    success, encoded = cv2.imencode(".png", img_matrix)
+    return encoded.tobytes()
+
+
+def read_upload_file(upload) -> memoryview:
+    buffer = bytearray(upload.size)
+    upload.file.seek(0)
+    read = upload.file.readinto(buffer)
+    return memoryview(buffer)[:read]
+
+
+async def read_json_image(encoded_data: str) -> bytes:
+    return await asyncio.to_thread(base64_to_bytes, encoded_data)
+
+
+async def read_image_upload(request: Request) -> Buffer:
+    """
+    Reads the raw image of an `/upload` request, either sent as the whole body
+    (`application/octet-stream`) or as the `file` field of a multipart form.
+    """
+    content_type = request.headers.get("content-type", "")
+    content_length = request.headers.get("content-length")
+
+    if content_type.startswith("multipart/form-data"):
+        # The form is only parsed, and spooled, once its size is known to be fine.
+        try:
+            form_length = int(content_length) if content_length else None
+        except ValueError:
+            raise HTTPException(400, "Invalid Content-Length!")
+        if form_length is None:
+            raise HTTPException(411, "Multipart uploads need a Content-Length.")
+        if form_length > max_upload_bytes + MULTIPART_OVERHEAD_BYTES:
+            raise HTTPException(413, f"The image is bigger than {max_upload_bytes} bytes.")
+
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(422, "The form must contain the image in the 'file' field.")
+        if upload.size is not None and upload.size > max_upload_bytes:
+            raise HTTPException(413, f"The image is bigger than {max_upload_bytes} bytes.")
+        return await asyncio.to_thread(read_upload_file, upload)
+
+    try:
+        return await read_stream(
+            request.stream(),
+            int(content_length) if content_length else None,
+            max_upload_bytes,
+        )
+    except BodyTooLarge as e:
+        raise HTTPException(413, str(e))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+async def decode_image(
+    buffer: Buffer, min_side: Optional[int] = None
+) -> Tuple[np.ndarray, float]:
+    """
+    Returns the decoded image and the factor that maps its coordinates back to
+    the original resolution.
+    """
+    if reduced_decode and min_side is not None:
+        decoded_img, scale = await asyncio.to_thread(
+            bytes_to_img_reduced, buffer, min_side
+        )
+    else:
+        decoded_img, scale = await asyncio.to_thread(bytes_to_img, buffer), 1.0
+
+    if decoded_img is None:
+        raise HTTPException(422, "The image could not be decoded.")
+    return decoded_img, scale
+
+
+@app.get("/engines")
+def engines():
+    return {name: config._asdict() for name, config in engine_configs.items()}
+
+
+@app.get("/cache")
+def cache():
+    return {
+        **result_cache.stats(),
+        "llm": None if llm_cache is None else llm_cache.stats(),
+        "translation_memory": (
+            None if translation_memory is None else translation_memory.stats()
+        ),
+    }
+
+
+async def cached_prediction(
+    buffer: Buffer, model: str, compute: Callable[[], Awaitable[Any]], **params
+) -> Any:
+    digest = await asyncio.to_thread(digest_bytes, buffer)
+    key = ResultCache.make_key(digest, model, **params)
+
+    output = result_cache.get(key)
+    if output is None:
+        output = await compute()
+        result_cache.put(key, output)
+
     return output
 
 
-@app.post("/ecg-descritores")
-def read_route(img: ModelInput) -> Dict[str, str | List[str]]:
-    decoded_img = base64_to_img(img.img)
+async def run_diseases(buffer: Buffer) -> Dict[str, bool]:
+    min_side = min(DEFAULT_INPUT_SIZE)
+
+    async def compute():
+        decoded_img, _ = await decode_image(buffer, min_side)
+        return (await multiple_diseases_engine.predict([decoded_img]))[0]
+
+    return await cached_prediction(buffer, "diseases", compute, min_side=min_side)
+
+
+async def run_ecg(buffer: Buffer, threshold: float = 0.2) -> Dict[str, str | List[str]]:
+    async def compute():
+        decoded_img, _ = await decode_image(buffer, ECG_INPUT_SIZE)
+        request = ECGRequest(decoded_img, threshold=threshold)
+        return (await ecg_classifier_engine.predict([request]))[0]
+
+    return await cached_prediction(
+        buffer, "ecg", compute, min_side=ECG_INPUT_SIZE, threshold=threshold
+    )
+
+
+async def run_modality(buffer: Buffer) -> Dict[str, bool]:
+    min_side = min(MODALITY_INPUT_SIZE)
+
+    async def compute():
+        decoded_img, _ = await decode_image(buffer, min_side)
+        return (await modality_engine.predict([decoded_img]))[0]
+
+    return await cached_prediction(buffer, "modality", compute, min_side=min_side)
+
+
+async def run_region(buffer: Buffer) -> Dict[str, bool]:
+    min_side = min(DEFAULT_INPUT_SIZE)
+
+    async def compute():
+        decoded_img, _ = await decode_image(buffer, min_side)
+        return (await region_engine.predict([decoded_img]))[0]
 
-    from models.ecg.model_api import load_clip_model
+    return await cached_prediction(buffer, "region", compute, min_side=min_side)
+
+
+async def run_fracture(buffer: Buffer, mode: str) -> Response | Dict:
+    # The overlay is drawn on the original resolution, the detections only need
+    # the detector's.
+    min_side = DETECTOR_INPUT_SIZE if mode == "json" else None
+
+    async def compute():
+        decoded_img, scale = await decode_image(buffer, min_side)
+        request = FractureRequest(decoded_img, render=mode == "image")
+        output = (await fracture_engine.predict([request]))[0]
+
+        if mode == "json":
+            height, width = decoded_img.shape[:2]
+            return {
+                "detections": scale_detections(output["detections"], scale),
+                "width": round(width * scale),
+                "height": round(height * scale),
+            }
+
+        return await asyncio.to_thread(encode_png, output["plot"])
+
+    output = await cached_prediction(
+        buffer, "fracture", compute, min_side=min_side, mode=mode
+    )
+
+    if mode == "json":
+        return output
+    return Response(content=output, media_type="image/png")
+
+
+RADIOGRAPHY_INPUT_SIZES = {
+    "modality": MODALITY_INPUT_SIZE,
+    "region": DEFAULT_INPUT_SIZE,
+    "diseases": DEFAULT_INPUT_SIZE,
+}
+# Resized the way the engines would themselves. Without a Keras engine this
+# process never imports TensorFlow.
+KERAS_INPUT_SIZES = {
+    size
+    for name, size in RADIOGRAPHY_INPUT_SIZES.items()
+    if engine_configs[name].backend == "keras"
+}
+
+
+async def run_radiography(
+    buffer: Buffer, fracture: bool, fracture_overlay: bool
+) -> Dict:
+    digest = await asyncio.to_thread(digest_bytes, buffer)
+
+    # Every model is keyed by its own input size, like on its own endpoint, so
+    # they share cache entries and toggling the fracture analysis only runs the
+    # detector.
+    min_sides = {name: min(size) for name, size in RADIOGRAPHY_INPUT_SIZES.items()}
+    keys = {
+        name: ResultCache.make_key(digest, name, min_side=min_side)
+        for name, min_side in min_sides.items()
+    }
+    if fracture:
+        # Like on /fracture, the overlay is drawn on the original resolution.
+        min_sides["fracture"] = None if fracture_overlay else DETECTOR_INPUT_SIZE
+        keys["fracture"] = ResultCache.make_key(
+            digest, "fracture", min_side=min_sides["fracture"], overlay=fracture_overlay
+        )
+
+    output = {name: result_cache.get(key) for name, key in keys.items()}
+    missing = [name for name, value in output.items() if value is None]
+    if not missing:
+        return output
+
+    # Decoded once, at the largest resolution a missing model needs (None is the
+    # original one), and resized once per classifier input size.
+    needed_sides = {min_sides[name] for name in missing}
+    decoded_img, scale = await decode_image(
+        buffer, None if None in needed_sides else max(needed_sides)
+    )
+    prepared = {}
+    for size in {RADIOGRAPHY_INPUT_SIZES[n] for n in missing if n != "fracture"}:
+        prepared.update(
+            await asyncio.to_thread(
+                prepare_for_models, decoded_img, (size,), size in KERAS_INPUT_SIZES
+            )
+        )
+
+    # Every engine gets its batch at once, so they all run concurrently.
+    engines = {
+        "modality": modality_engine,
+        "region": region_engine,
+        "diseases": multiple_diseases_engine,
+    }
+    engine_inputs = {
+        name: (engine, prepared[RADIOGRAPHY_INPUT_SIZES[name]])
+        for name, engine in engines.items()
+        if name in missing
+    }
+    if "fracture" in missing:
+        engine_inputs["fracture"] = (
+            fracture_engine,
+            FractureRequest(decoded_img, render=fracture_overlay),
+        )
+
+    results = await asyncio.gather(
+        *[
+            engine_inputs[name][0].predict([engine_inputs[name][1]])
+            for name in missing
+        ]
+    )
+    for name, result in zip(missing, results):
+        output[name] = result[0]
+
+    if "fracture" in missing:
+        plot = output["fracture"]["plot"]
+        output["fracture"] = {
+            "detections": scale_detections(output["fracture"]["detections"], scale)
+        }
+        if plot is not None:
+            encoded = await asyncio.to_thread(encode_png, plot)
+            output["fracture"]["overlay"] = base64.b64encode(encoded).decode("ascii")
+
+    for name in missing:
+        result_cache.put(keys[name], output[name])
 
-    direct_model = load_clip_model()
-    output: Dict[str, str | List[str]] = direct_model.predict(
-        [decoded_img], threshold=0.2
-    )[0]
     return output
 
 
+@app.post("/raio-x-doencas")
+async def diseases(img: ModelInput) -> Dict[str, bool]:
+    return await run_diseases(await read_json_image(img.img))
+
+
+@app.post("/raio-x-doencas/upload", openapi_extra=UPLOAD_OPENAPI)
+async def diseases_upload(
+    buffer: Buffer = Depends(read_image_upload),
+) -> Dict[str, bool]:
+    return await run_diseases(buffer)
+
+
+@app.post("/ecg-descritores")
+async def read_route(img: ModelInput) -> Dict[str, str | List[str]]:
+    return await run_ecg(await read_json_image(img.img))
+
+
+@app.post("/ecg-descritores/upload", openapi_extra=UPLOAD_OPENAPI)
+async def read_route_upload(
+    buffer: Buffer = Depends(read_image_upload),
+) -> Dict[str, str | List[str]]:
+    return await run_ecg(buffer)
+
+
 @app.post("/modalidade")
-def modality(img: ModelInput) -> Dict[str, bool]:
-    decoded_img = base64_to_img(img.img)
-    output = modality_streamer.predict([decoded_img])[0]
-    return output
+async def modality(img: ModelInput) -> Dict[str, bool]:
+    return await run_modality(await read_json_image(img.img))
+
+
+@app.post("/modalidade/upload", openapi_extra=UPLOAD_OPENAPI)
+async def modality_upload(
+    buffer: Buffer = Depends(read_image_upload),
+) -> Dict[str, bool]:
+    return await run_modality(buffer)
 
 
 @app.post("/regiao")
-def region(img: ModelInput) -> Dict[str, bool]:
-    decoded_img = base64_to_img(img.img)
-    output = region_streamer.predict([decoded_img])[0]
-    return output
+async def region(img: ModelInput) -> Dict[str, bool]:
+    return await run_region(await read_json_image(img.img))
 
 
-@app.post("/fracture")
-def region(img: ModelInput) -> Dict[str, bool]:
-    decoded_img = base64_to_img(img.img)
-    img_matrix = fracture_streamer.predict([decoded_img])[0]
-    success, encoded = cv2.imencode(".png", img_matrix)
+@app.post("/regiao/upload", openapi_extra=UPLOAD_OPENAPI)
+async def region_upload(
+    buffer: Buffer = Depends(read_image_upload),
+) -> Dict[str, bool]:
+    return await run_region(buffer)
+
+
+@app.post("/fracture", response_model=None)
+async def fracture(
+    img: ModelInput, mode: Literal["image", "json"] = "image"
+) -> Response | Dict:
+    return await run_fracture(await read_json_image(img.img), mode)
+
+
+@app.post("/fracture/upload", response_model=None, openapi_extra=UPLOAD_OPENAPI)
+async def fracture_upload(
+    mode: Literal["image", "json"] = "image",
+    buffer: Buffer = Depends(read_image_upload),
+) -> Response | Dict:
+    return await run_fracture(buffer, mode)
+
+
+@app.post("/radiografia")
+async def radiography(inp: RadiographyInput) -> Dict:
+    return await run_radiography(
+        await read_json_image(inp.img), inp.fracture, inp.fracture_overlay
+    )
+
 
-    return Response(content=encoded.tobytes(), media_type="image/png")
+@app.post("/radiografia/upload", openapi_extra=UPLOAD_OPENAPI)
+async def radiography_upload(
+    fracture: bool = False,
+    fracture_overlay: bool = False,
+    buffer: Buffer = Depends(read_image_upload),
+) -> Dict:
+    return await run_radiography(buffer, fracture, fracture_overlay)
 
 
 @app.post("/index")
 async def index(inp: IndexInput):
     indexed = await index_texts(
-        client, inp.text, env.get("SNOMED_API_KEY"), use_soap=inp.use_soap
+        client,
+        inp.text,
+        env.get("SNOMED_API_KEY"),
+        use_soap=inp.use_soap,
+        ctakes=ctakes_batcher,
+        memory=translation_memory,
+        annotator=concept_annotator,
+        repair=repair_policy,
     )
 
-    return {"text": indexed["texts"][0], "medicalTerms": indexed["medicalTerms"][0]}
+    return {
+        "text": indexed["texts"][0],
+        "medicalTerms": indexed["medicalTerms"][0],
+        "matching": indexed["matching"][0],
+    }
+
+
+@app.post("/index/stream")
+async def index_stream(inp: IndexInput) -> StreamingResponse:
+    """
+    Same result as /index, as newline-delimited JSON events sent while each stage
+    finishes, see `stream_index_text`.
+    """
+
+    async def events():
+        try:
+            async for event in stream_index_text(
+                client,
+                inp.text,
+                env.get("SNOMED_API_KEY"),
+                use_soap=inp.use_soap,
+                ctakes=ctakes_batcher,
+                memory=translation_memory,
+                annotator=concept_annotator,
+                repair=repair_policy,
+            ):
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        except Exception as e:
+            # Headers are gone by now, the failure has to travel in the stream.
+            print(f"[ERROR] /index/stream failed: {e!r}")
+            yield json.dumps({"event": "error", "detail": str(e)}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
@@ -1,6 +1,16 @@
 from .radio.managed_models import create_modality, create_diseases, create_region
-from .ecg.managed_model import create_ecg_classifier
-from .yolo.managed_models import create_fracture
+from .radio.model import prepare_for_models, DEFAULT_INPUT_SIZE, MODALITY_INPUT_SIZE
+from .ecg.managed_model import create_ecg_classifier, ECGRequest
+from .ecg.model_api import ECG_INPUT_SIZE
+from .yolo.managed_models import create_fracture, FractureRequest
+from .yolo.base_predictor import DETECTOR_INPUT_SIZE, scale_detections
+from .internals import (
+    AsyncStreamer,
+    EngineConfig,
+    load_engine_configs,
+    ResultCache,
+    digest_bytes,
+)
 
 __all__ = [
     "create_modality",
@@ -8,4 +18,17 @@ __all__ = [
     "create_region",
     "create_ecg_classifier",
     "create_fracture",
+    "ECGRequest",
+    "FractureRequest",
+    "prepare_for_models",
+    "DEFAULT_INPUT_SIZE",
+    "MODALITY_INPUT_SIZE",
+    "ECG_INPUT_SIZE",
+    "DETECTOR_INPUT_SIZE",
+    "scale_detections",
+    "AsyncStreamer",
+    "EngineConfig",
+    "load_engine_configs",
+    "ResultCache",
+    "digest_bytes",
 ]
@@ -1,3 +1,4 @@
-from .managed_model import create_ecg_classifier
+from .managed_model import create_ecg_classifier, ECGRequest
+from .model_api import ECG_INPUT_SIZE
 
-__all__ = ["create_ecg_classifier"]
+__all__ = ["create_ecg_classifier", "ECGRequest", "ECG_INPUT_SIZE"]
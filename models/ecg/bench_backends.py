@@ -0,0 +1,77 @@
+"""
+Times the ECG classifier on CPU with every backend of `CLIPVisionModelWrapper`,
+float32 and int8, on the batch sizes the engine runs. Every variant is warmed up
+first, so compilation and tracing aren't timed, and its probabilities are compared
+with the eager float32 ones on the same random batch.
+
+Run with: python -m models.ecg.bench_backends [intra_op_threads]
+
+The ONNX variants are skipped until `python -m models.ecg.export [--int8]` wrote
+them. Accuracy on real tracings is checked by `python -m models.ecg.export --check`.
+"""
+
+import sys
+import time
+import numpy as np
+import torch
+from .export import VARIANTS
+from .model_api import _MODEL_PATH, ECG_INPUT_SIZE, load_clip_model, onnx_path
+
+BATCH_SIZES = (1, 2, 4, 8)
+REPEAT = 10
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    if threads is not None:
+        torch.set_num_threads(threads)
+
+    rng = np.random.default_rng(0)
+    batches = {
+        batch_size: rng.standard_normal(
+            (batch_size, 3, ECG_INPUT_SIZE, ECG_INPUT_SIZE), dtype=np.float32
+        )
+        for batch_size in BATCH_SIZES
+    }
+
+    print(
+        f"{'backend':<18}{'batch':>6}{'ms/batch':>10}{'img/s':>9}"
+        f"{'speedup':>9}{'max diff':>10}"
+    )
+    baselines, references = {}, {}
+    for backend, int8 in (("eager", False), *VARIANTS):
+        name = backend + (" int8" if int8 else "")
+        if backend == "onnx" and not onnx_path(_MODEL_PATH, int8).exists():
+            print(f"{name:<18}  skipped: not exported")
+            continue
+
+        try:
+            model = load_clip_model(
+                backend=backend, int8=int8, intra_op_threads=threads
+            )
+            model.warmup(BATCH_SIZES)
+        except Exception as e:
+            # torch.compile needs a working compiler toolchain.
+            print(f"{name:<18}  failed: {e!r}")
+            continue
+
+        for batch_size, batch in batches.items():
+            output = model.probabilities(batch)
+            start = time.perf_counter()
+            for _ in range(REPEAT):
+                model.probabilities(batch)
+            elapsed = (time.perf_counter() - start) / REPEAT
+
+            baseline = baselines.setdefault(batch_size, elapsed)
+            reference = references.setdefault(batch_size, output)
+            print(
+                f"{name:<18}{batch_size:>6}{elapsed * 1000:>10.1f}"
+                f"{batch_size / elapsed:>9.1f}{baseline / elapsed:>8.1f}x"
+                f"{np.abs(output - reference).max():>10.2e}"
+            )
+
+        del model
+
+
+if __name__ == "__main__":
+    main()
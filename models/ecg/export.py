@@ -0,0 +1,141 @@
+"""
+Exports the ECG classifier from `models/ecg/weights` to ONNX, next to the
+safetensors weights (see `model_api.onnx_path`), and checks that every CPU backend
+gives the same probabilities and labels as the plain PyTorch model.
+
+    python -m models.ecg.export [--int8] [--skip-export] [--check DIR]
+
+`--int8` adds a dynamically quantized version (int8 weights, activations quantized
+at runtime), which needs no calibration data. `--check` runs the eager float32
+model and every other backend (int8 PyTorch, `torch.compile`, TorchScript and the
+ONNX exports that exist) on the images of a folder, and reports the largest and
+mean difference in sigmoid probabilities and how often the `gravidade` labels agree.
+
+Exporting needs `onnx` and `onnxruntime` on top of PyTorch.
+"""
+
+import argparse
+import numpy as np
+import torch
+from pathlib import Path
+from typing import Dict, List, Tuple
+from .model_api import (
+    _MODEL_PATH,
+    ECG_INPUT_SIZE,
+    CLIPVisionModelWrapper,
+    load_clip_model,
+    onnx_path,
+)
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff"}
+CHECK_BATCH_SIZE = 8
+
+# (backend, int8) pairs compared with the eager float32 model.
+VARIANTS = (
+    ("eager", True),
+    ("compile", False),
+    ("torchscript", False),
+    ("torchscript", True),
+    ("onnx", False),
+    ("onnx", True),
+)
+
+
+def export_onnx(model: CLIPVisionModelWrapper, int8: bool = False) -> List[Path]:
+    path = onnx_path(_MODEL_PATH)
+    example = torch.zeros(1, 3, ECG_INPUT_SIZE, ECG_INPUT_SIZE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model.model,
+            (example,),
+            str(path),
+            input_names=["pixel_values"],
+            output_names=["logits"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=17,
+        )
+    written = [path]
+
+    if int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = onnx_path(_MODEL_PATH, int8=True)
+        quantize_dynamic(str(path), str(int8_path), weight_type=QuantType.QInt8)
+        written.append(int8_path)
+
+    return written
+
+
+def load_samples(
+    model: CLIPVisionModelWrapper, folder: Path, limit: int
+) -> List[np.ndarray]:
+    """
+    Batches of up to `CHECK_BATCH_SIZE` images, preprocessed the way the app does it.
+    """
+    paths = sorted(
+        str(path)
+        for path in folder.rglob("*")
+        if path.suffix.lower() in IMAGE_EXTENSIONS
+    )[:limit]
+    if not paths:
+        raise ValueError(f"No images found in {folder}.")
+
+    return [
+        model.preprocess(paths[i : i + CHECK_BATCH_SIZE])
+        for i in range(0, len(paths), CHECK_BATCH_SIZE)
+    ]
+
+
+def run_samples(
+    model: CLIPVisionModelWrapper, samples: List[np.ndarray]
+) -> Tuple[np.ndarray, List[Dict]]:
+    probs = np.concatenate([model.probabilities(batch) for batch in samples])
+    return probs, model.match_labels(probs)
+
+
+def check_parity(samples_folder: Path, limit: int):
+    reference = load_clip_model()
+    samples = load_samples(reference, samples_folder, limit)
+    expected, expected_labels = run_samples(reference, samples)
+    del reference
+
+    print(f"{'backend':<18}{'agree':>11}{'rate':>8}{'max diff':>12}{'mean diff':>12}")
+    for backend, int8 in VARIANTS:
+        name = backend + (" int8" if int8 else "")
+        if backend == "onnx" and not onnx_path(_MODEL_PATH, int8).exists():
+            continue
+
+        try:
+            model = load_clip_model(backend=backend, int8=int8)
+            probs, labels = run_samples(model, samples)
+        except Exception as e:
+            # torch.compile needs a working compiler toolchain.
+            print(f"{name:<18}  failed: {e!r}")
+            continue
+
+        agree = sum(a == b for a, b in zip(labels, expected_labels))
+        diff = np.abs(probs - expected)
+        print(
+            f"{name:<18}{agree:>5}/{len(labels):<5}{agree / len(labels):>8.1%}"
+            f"{diff.max():>12.2e}{diff.mean():>12.2e}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--int8", action="store_true")
+    parser.add_argument("--check", type=Path)
+    parser.add_argument("--check-limit", type=int, default=500)
+    parser.add_argument("--skip-export", action="store_true")
+    args = parser.parse_args()
+
+    if not args.skip_export:
+        for path in export_onnx(load_clip_model(), args.int8):
+            print(f"[INFO] Wrote {path}")
+
+    if args.check is not None:
+        check_parity(args.check, args.check_limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,68 @@
 import numpy as np
-from typing import List, Dict
-from service_streamer import ManagedModel, Streamer
+from typing import List, Dict, NamedTuple, Optional, Sequence
+from service_streamer import ManagedModel
 from .model_api import load_clip_model
 from functools import lru_cache
-from ..internals import announce_start
+from ..internals import (
+    announce_start,
+    create_streamer,
+    limit_torch_threads,
+    EngineConfig,
+)
+
+DEFAULT_THRESHOLD = 0.5
+
+
+class ECGRequest(NamedTuple):
+    image: np.ndarray
+    threshold: float = DEFAULT_THRESHOLD
 
 
 class ECGClassifier(ManagedModel):
 
-    def init_model(self):
-        self.model = load_clip_model()
+    def init_model(
+        self,
+        intra_op_threads: Optional[int] = None,
+        backend: str = "eager",
+        int8: bool = False,
+        warmup_batch_sizes: Sequence[int] = (),
+    ):
+        limit_torch_threads(intra_op_threads)
+        self.model = load_clip_model(
+            backend=backend, int8=int8, intra_op_threads=intra_op_threads
+        )
+        self.model.warmup(warmup_batch_sizes)
 
-    def predict(self, batch: List[np.ndarray]) -> List[Dict[str, str | List[str]]]:
-        return self.model.predict(batch, threshold=0.5)
+    def predict(
+        self, batch: List[ECGRequest | np.ndarray]
+    ) -> List[Dict[str, str | List[str]]]:
+        # Plain arrays are still accepted and use the default threshold.
+        requests = [
+            item if isinstance(item, ECGRequest) else ECGRequest(item)
+            for item in batch
+        ]
+
+        return self.model.predict(
+            [request.image for request in requests],
+            threshold=[request.threshold for request in requests],
+        )
 
 
 @lru_cache(maxsize=1)
 @announce_start("ECG Classifier")
-def create_ecg_classifier(cuda_devices, batch_size, max_latency, worker_num):
-    return Streamer(ECGClassifier, batch_size, max_latency, worker_num, cuda_devices)
+def create_ecg_classifier(config: EngineConfig):
+    # Compiled and traced models specialize on the first batches of every size.
+    warmup_batch_sizes = config.warmup_batch_sizes
+    if warmup_batch_sizes is None and config.torch_backend in (
+        "compile",
+        "torchscript",
+    ):
+        warmup_batch_sizes = tuple(range(1, config.batch_size + 1))
+
+    return create_streamer(
+        ECGClassifier,
+        config,
+        backend=config.torch_backend,
+        int8=config.torch_int8,
+        warmup_batch_sizes=warmup_batch_sizes or (),
+    )
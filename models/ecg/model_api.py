@@ -3,11 +3,19 @@ import json
 from safetensors.torch import load_file, save_file
 from transformers import CLIPVisionModel, CLIPImageProcessor
 from PIL import Image
-from typing import Dict, List, Tuple, Iterable
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Iterable
 import numpy as np
 import torch.nn.functional as F
 from scipy.special import expit
 
+# Shortest side the CLIP processor resizes to before cropping.
+ECG_INPUT_SIZE = 224
+# "eager" is plain PyTorch. "compile" and "torchscript" run the same network through
+# torch.compile or a frozen TorchScript trace, "onnx" the export written by
+# `python -m models.ecg.export` with ONNX Runtime.
+ECG_BACKENDS = ("eager", "compile", "torchscript", "onnx")
+
 
 class CLIPVisionClassifier(torch.nn.Module):
     def __init__(
@@ -54,12 +62,72 @@ def map_tensor_to_nonzero_list(tensor: torch.IntTensor) -> Iterable[List[int]]:
 def pack_to_dict(pack: List[str], label: str) -> List[Dict[str, str]]:
     return [{label: p} for p in pack]
 
+
+def onnx_path(model_path: str | Path, int8: bool = False) -> Path:
+    """
+    `model.safetensors` -> `model.onnx`, or `model.int8.onnx` for the quantized one.
+    """
+    model_path = Path(model_path)
+    return model_path.with_name(model_path.stem + (".int8" if int8 else "") + ".onnx")
+
+
+def quantize_linear_layers(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    Dynamic int8 quantization: the Linear weights are stored as int8 and the
+    activations quantized on the fly, which is where a ViT spends its time on CPU.
+    """
+    return torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+def compile_classifier(model: torch.nn.Module, backend: str):
+    if backend == "compile":
+        return torch.compile(model)
+
+    if backend == "torchscript":
+        example = torch.zeros(1, 3, ECG_INPUT_SIZE, ECG_INPUT_SIZE)
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example)
+        # Freezes the weights into the graph and fuses what it can for CPU.
+        return torch.jit.optimize_for_inference(traced)
+
+    return model
+
+
+def load_onnx_session(path: Path, intra_op_threads: Optional[int] = None):
+    import onnxruntime as ort
+
+    if not path.exists():
+        raise FileNotFoundError(
+            f"{path} doesn't exist, export it with python -m models.ecg.export."
+        )
+
+    options = ort.SessionOptions()
+    if intra_op_threads is not None:
+        options.intra_op_num_threads = intra_op_threads
+
+    return ort.InferenceSession(
+        str(path), options, providers=["CPUExecutionProvider"]
+    )
+
+
 class CLIPVisionModelWrapper:
     def __init__(
         self,
         model_path: str,
         label_json: str,
+        backend: str = "eager",
+        int8: bool = False,
+        intra_op_threads: Optional[int] = None,
     ):
+        """
+        `backend` is one of `ECG_BACKENDS`. `int8` quantizes the Linear layers, or
+        with "onnx" loads the dynamically quantized export.
+        """
+        if backend not in ECG_BACKENDS:
+            raise ValueError(f"Unknown ECG backend: {backend}")
+
         self.label_to_id = load_json(label_json)
         self.id_to_label = {
             v: k for k, v in self.label_to_id.items()
@@ -78,12 +146,27 @@ class CLIPVisionModelWrapper:
             "TS": "Taquicardia Sinusal"
         }
 
-        self.model = CLIPVisionClassifier(
-            num_labels=self.num_labels
+        self.backend = backend
+        self.model = None
+        self.session = None
+
+        if backend == "onnx":
+            # The exported graph has the weights, the PyTorch model isn't needed.
+            self.session = load_onnx_session(
+                onnx_path(model_path, int8), intra_op_threads
+            )
+        else:
+            self.model = CLIPVisionClassifier(
+                num_labels=self.num_labels
+            )
+            model_state = load_file(model_path)
+            self.model.load_state_dict(model_state)
+            self.model.eval()
+            if int8:
+                self.model = quantize_linear_layers(self.model)
+        self.forward = (
+            None if self.model is None else compile_classifier(self.model, backend)
         )
-        model_state = load_file(model_path)
-        self.model.load_state_dict(model_state)
-        self.model.eval()
 
         self.feature_extractor = CLIPImageProcessor.from_pretrained(
             "openai/clip-vit-large-patch14"
@@ -91,18 +174,37 @@ class CLIPVisionModelWrapper:
 
         self.feedback_data = []
 
+    def run(self, pixel_values: np.ndarray) -> np.ndarray:
+        """
+        Logits of a batch the feature extractor already processed.
+        """
+        if self.session is not None:
+            pixel_values = np.asarray(pixel_values, dtype=np.float32)
+            return self.session.run(None, {"pixel_values": pixel_values})[0]
+
+        with torch.no_grad():
+            return self.forward(torch.as_tensor(pixel_values)).cpu().numpy()
+
+    def warmup(self, batch_sizes: Sequence[int]):
+        """
+        Runs a blank batch of every size, so compilation and the first-run
+        specializations happen before any request.
+        """
+        for batch_size in batch_sizes:
+            self.run(
+                np.zeros(
+                    (batch_size, 3, ECG_INPUT_SIZE, ECG_INPUT_SIZE), np.float32
+                )
+            )
+
     def format_label_with_description(self, label: str) -> str:
         if label in self.label_descriptions:
             return f"{label}: {self.label_descriptions[label]}"
         return label
 
-    def predict(
-        self, images: List[np.ndarray] | List[str] | List[Image.Image], 
-        threshold: float = 0.5
-    ) -> List[Dict[str, str | List[str]]]:
-        if not isinstance(images, List) or len(images) == 0:
-            raise ValueError("Inputs is not a list or is empty!")
-
+    def preprocess(
+        self, images: List[np.ndarray] | List[str] | List[Image.Image]
+    ) -> np.ndarray:
         processed_images = []
         for img in images:
             if isinstance(img, str):
@@ -113,34 +215,58 @@ class CLIPVisionModelWrapper:
                 processed_images.append(img.convert("RGB"))
             else:
                 raise TypeError(f"Unsupported image type: {type(img)}")
-        
-        inputs = self.feature_extractor(processed_images, return_tensors="pt")["pixel_values"]
+
+        return self.feature_extractor(processed_images, return_tensors="np")[
+            "pixel_values"
+        ]
+
+    def probabilities(self, pixel_values: np.ndarray) -> np.ndarray:
+        return expit(self.run(pixel_values))
+
+    def predict(
+        self, images: List[np.ndarray] | List[str] | List[Image.Image], 
+        threshold: float | List[float] = 0.5
+    ) -> List[Dict[str, str | List[str]]]:
+        """
+        `threshold` can be a single value for the whole batch or one value
+        per image, so requests with different thresholds can share a forward pass.
+        """
+        if not isinstance(images, List) or len(images) == 0:
+            raise ValueError("Inputs is not a list or is empty!")
+
+        return self.match_labels(
+            self.probabilities(self.preprocess(images)), threshold
+        )
+
+    def match_labels(
+        self, probs: np.ndarray, threshold: float | List[float] = 0.5
+    ) -> List[Dict[str, str | List[str]]]:
+        if isinstance(threshold, (list, tuple)):
+            if len(threshold) != len(probs):
+                raise ValueError("The number of thresholds must match the number of images!")
+            thresholds = np.asarray(threshold, dtype=np.float32)
+        else:
+            thresholds = np.full(len(probs), threshold, dtype=np.float32)
 
         results = []
-        self.model.eval()
+        preds = (probs >= thresholds[:, None]).astype(int)
         
-        with torch.no_grad():
-            logits = self.model(inputs)
-            probs = expit(logits.cpu().numpy())
-            preds = (probs >= threshold).astype(int)
+        for i in range(len(probs)):
+
+            preds[i, 6] = 0
             
-            for i in range(len(images)):
-
-                preds[i, 6] = 0
-                probs[i, 6] = 0.0
-                
-                predicted_indices = np.where(preds[i] >= threshold)[0]
-                predicted_indices = predicted_indices[predicted_indices != 6]
-                
-                if len(predicted_indices) > 0:
-                    label_acronyms = [self.id_to_label[idx] for idx in predicted_indices]
-                    formatted_labels = [self.format_label_with_description(label) for label in label_acronyms]
-                    if len(formatted_labels) == 1:
-                        results.append({"gravidade": formatted_labels[0]})
-                    else:
-                        results.append({"gravidade": formatted_labels})
+            predicted_indices = np.where(preds[i] > 0)[0]
+            predicted_indices = predicted_indices[predicted_indices != 6]
+            
+            if len(predicted_indices) > 0:
+                label_acronyms = [self.id_to_label[idx] for idx in predicted_indices]
+                formatted_labels = [self.format_label_with_description(label) for label in label_acronyms]
+                if len(formatted_labels) == 1:
+                    results.append({"gravidade": formatted_labels[0]})
                 else:
-                    results.append({"gravidade": "Não Identificado"})
+                    results.append({"gravidade": formatted_labels})
+            else:
+                results.append({"gravidade": "Não Identificado"})
         
         return results
 
@@ -162,9 +288,10 @@ _WEIGHTS_PATH = _BASE_PATH.joinpath("weights")
 _MODEL_PATH = _WEIGHTS_PATH.joinpath("model.safetensors")
 _LABELS_JSON = _BASE_PATH.joinpath("label_to_id.json")
 
-load_clip_model = lambda: CLIPVisionModelWrapper(
+load_clip_model = lambda **backend: CLIPVisionModelWrapper(
     model_path=str(_MODEL_PATH),
     label_json=str(_LABELS_JSON),
+    **backend,
 )
 
 if __name__ == "__main__":
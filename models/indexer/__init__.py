@@ -1,5 +1,10 @@
 from .process import process_texts as index_texts
+from .process import stream_process_text as stream_index_text
 from .common import Keywords
+from .batching import CTakesBatcher
+from .llm_cache import CachedClient, LLMCache
+from .memory import TranslationMemory
+from .annotator import ConceptAnnotator
 
 __all__ = [
     "ClientBase",
@@ -7,5 +12,11 @@ __all__ = [
     "Qwen3OllamaClient",
     "Qwen3OpenAiClient",
     "index_texts",
+    "stream_index_text",
     "Keywords",
+    "CTakesBatcher",
+    "CachedClient",
+    "LLMCache",
+    "TranslationMemory",
+    "ConceptAnnotator",
 ]
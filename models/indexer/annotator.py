@@ -0,0 +1,313 @@
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Sequence, Tuple, Union
+from .common import CUIInfo, Keywords, Spans
+
+TOKEN = re.compile(r"\w+(?:[-'/]\w+)*|[^\w\s]")
+SENTENCE_END = {".", ";", ":", "!", "?"}
+
+# NegEx-style triggers for the english text cTAKES would receive. "pre" triggers
+# act on the concepts after them and "post" ones on the concepts before them, up to
+# `max_scope` tokens away and never across a sentence end or a terminator. Pseudo
+# triggers only exist to stop the shorter triggers inside them from firing.
+NEGATION_PRE = [
+    "no",
+    "not",
+    "without",
+    "denies",
+    "denied",
+    "deny",
+    "negative for",
+    "absence of",
+    "free of",
+    "no evidence of",
+    "no signs of",
+    "no sign of",
+]
+NEGATION_POST = [
+    "is absent",
+    "are absent",
+    "absent",
+    "was ruled out",
+    "is ruled out",
+    "ruled out",
+    "was excluded",
+    "excluded",
+    "not seen",
+    "not identified",
+    "not present",
+]
+UNCERTAIN_PRE = [
+    "possible",
+    "possibly",
+    "probable",
+    "probably",
+    "likely",
+    "may",
+    "might",
+    "suspected",
+    "suspicious for",
+    "suggestive of",
+    "questionable",
+    "question of",
+    "cannot exclude",
+    "cannot rule out",
+    "rule out",
+    "r/o",
+    "differential diagnosis",
+    "concern for",
+]
+UNCERTAIN_POST = [
+    "is suspected",
+    "is possible",
+    "cannot be excluded",
+    "cannot be ruled out",
+    "not excluded",
+    "is likely",
+    "unlikely",
+]
+PSEUDO = [
+    "no increase",
+    "no change",
+    "no interval change",
+    "not only",
+    "not necessarily",
+    "gram negative",
+    "without difficulty",
+]
+TERMINATORS = [
+    "but",
+    "however",
+    "although",
+    "though",
+    "except",
+    "apart from",
+    "aside from",
+    "which",
+    "whereas",
+    "yet",
+]
+
+
+def normalize_token(token: str) -> str:
+    """
+    Lowercase, with the plural "s" dropped so "effusions" finds "effusion". Done to
+    the dictionary and the text alike, so it only has to be consistent.
+    """
+    token = token.lower()
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[Tuple[str, int, int]]:
+    return [
+        (normalize_token(match.group()), match.start(), match.end())
+        for match in TOKEN.finditer(text)
+    ]
+
+
+class TokenTrie:
+    """
+    Multi-pattern matcher over token sequences. Every pattern is compiled into the
+    trie once, so a lookup costs the length of the longest pattern at each position
+    regardless of how many patterns there are.
+    """
+
+    def __init__(self):
+        self.root: Dict = {}
+
+    def add(self, tokens: Sequence[str], value):
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        # None never collides with a token.
+        node.setdefault(None, []).append(value)
+
+    def longest_match(self, tokens: Sequence[str], start: int) -> Tuple[int, List]:
+        """
+        End (exclusive) and values of the longest pattern starting at `start`, or
+        `(start, [])` if there's none.
+        """
+        node = self.root
+        end, values = start, []
+
+        for i in range(start, len(tokens)):
+            node = node.get(tokens[i])
+            if node is None:
+                break
+            if None in node:
+                end, values = i + 1, node[None]
+
+        return end, values
+
+
+class Concept(NamedTuple):
+    cui: str
+    semantic_group: str
+
+
+class Trigger(NamedTuple):
+    kind: str  # "negated", "uncertain", "pseudo" or "terminator"
+    direction: str  # "pre", "post" or "" for pseudo and terminator triggers
+
+
+def load_concept_table(path: Union[Path, str]) -> List[Tuple[str, Concept]]:
+    """
+    Reads `term|CUI|semantic group` lines. Empty lines and lines starting with `#`
+    are skipped.
+    """
+    entries = []
+
+    with open(path, "r", encoding="utf-8") as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            parts = [part.strip() for part in line.split("|")]
+            if len(parts) != 3:
+                raise ValueError(
+                    f"{path}:{line_number} should be 'term|CUI|semantic group'."
+                )
+
+            term, cui, semantic_group = parts
+            entries.append((term, Concept(cui, semantic_group)))
+
+    return entries
+
+
+def build_trigger_trie() -> TokenTrie:
+    trie = TokenTrie()
+
+    for phrases, trigger in (
+        (NEGATION_PRE, Trigger("negated", "pre")),
+        (NEGATION_POST, Trigger("negated", "post")),
+        (UNCERTAIN_PRE, Trigger("uncertain", "pre")),
+        (UNCERTAIN_POST, Trigger("uncertain", "post")),
+        (PSEUDO, Trigger("pseudo", "")),
+        (TERMINATORS, Trigger("terminator", "")),
+    ):
+        for phrase in phrases:
+            trie.add([token for token, _, _ in tokenize(phrase)], trigger)
+
+    return trie
+
+
+class ConceptAnnotator:
+    """
+    In-process replacement for the dictionary lookup and the negation/uncertainty
+    attributes of the cTAKES pipeline. Produces the same `Keywords` as
+    `ctakes.index_texts`, without starting a JVM.
+
+    Concepts are matched leftmost-longest against `dictionary`. Every match gets
+    one `CUIInfo` per semantic group, with all the CUIs the term has in it.
+    """
+
+    def __init__(self, dictionary: Union[Path, str], max_scope: int = 8):
+        self.max_scope = max_scope
+        self.concepts = TokenTrie()
+        self.triggers = build_trigger_trie()
+
+        grouped: Dict[Tuple[str, ...], Dict[str, List[str]]] = {}
+        for term, concept in load_concept_table(dictionary):
+            tokens = tuple(token for token, _, _ in tokenize(term))
+            cuis = grouped.setdefault(tokens, {}).setdefault(concept.semantic_group, [])
+            if concept.cui not in cuis:
+                cuis.append(concept.cui)
+
+        for tokens, groups in grouped.items():
+            for semantic_group, cuis in groups.items():
+                self.concepts.add(tokens, (cuis, semantic_group))
+
+    def annotate(self, text: str) -> Keywords:
+        tokens = tokenize(text)
+        words = [token for token, _, _ in tokens]
+
+        # Sentence of every token, so scopes never leave it.
+        sentence_of, sentence = [], 0
+        for word in words:
+            sentence_of.append(sentence)
+            if word in SENTENCE_END:
+                sentence += 1
+
+        triggers = self._find_triggers(words)
+        keywords: Keywords = {}
+
+        i = 0
+        while i < len(words):
+            end, values = self.concepts.longest_match(words, i)
+            if not values:
+                i += 1
+                continue
+
+            negated, uncertain = self._attributes(i, end, triggers, sentence_of)
+            start_char, end_char = tokens[i][1], tokens[end - 1][2]
+            expression = text[start_char:end_char]
+
+            for cuis, semantic_group in values:
+                keywords.setdefault(expression, []).append(
+                    CUIInfo(
+                        list(cuis),
+                        negated,
+                        uncertain,
+                        Spans(start_char, end_char),
+                        semantic_group,
+                    )
+                )
+            i = end
+
+        return keywords
+
+    def index_texts(self, texts: List[str]) -> Dict[int, Keywords]:
+        """
+        Same output as `ctakes.index_texts`.
+        """
+        return {i: self.annotate(text) for i, text in enumerate(texts)}
+
+    def _find_triggers(self, words: List[str]) -> List[Tuple[int, int, Trigger]]:
+        found = []
+
+        i = 0
+        while i < len(words):
+            end, values = self.triggers.longest_match(words, i)
+            if not values:
+                i += 1
+                continue
+
+            # The longest phrase wins, so pseudo triggers hide what's inside them.
+            found.append((i, end, values[0]))
+            i = end
+
+        return found
+
+    def _attributes(
+        self,
+        start: int,
+        end: int,
+        triggers: List[Tuple[int, int, Trigger]],
+        sentence_of: List[int],
+    ) -> Tuple[bool, bool]:
+        sentence = sentence_of[start]
+        pre = {"negated": False, "uncertain": False}
+        post = {"negated": False, "uncertain": False}
+
+        for t_start, t_end, trigger in triggers:
+            if sentence_of[t_start] != sentence or trigger.kind == "pseudo":
+                continue
+
+            if t_end <= start:
+                if start - t_end > self.max_scope:
+                    continue
+                if trigger.kind == "terminator":
+                    # Whatever came before a terminator doesn't reach the concept.
+                    pre = {"negated": False, "uncertain": False}
+                elif trigger.direction == "pre":
+                    pre[trigger.kind] = True
+            elif t_start >= end:
+                if t_start - end > self.max_scope or trigger.kind == "terminator":
+                    break
+                if trigger.direction == "post":
+                    post[trigger.kind] = True
+
+        return pre["negated"] or post["negated"], pre["uncertain"] or post["uncertain"]
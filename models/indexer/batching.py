@@ -0,0 +1,96 @@
+import asyncio
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from .common import Keywords
+from .ctakes import index_texts
+
+
+class CTakesBatcher:
+    """
+    Collects the texts of concurrent callers and indexes them together in a single
+    cTAKES run, so the JVM and dictionary startup is paid once per batch.
+
+    A batch is started once `max_batch_size` texts are waiting or `max_latency`
+    seconds after its first text arrived. At most `max_concurrent_runs` pipelines run
+    at the same time. A batch is only cut once it has a run slot, so while every slot
+    is busy new texts keep accumulating into the next batch, up to `max_batch_size`.
+    """
+
+    def __init__(
+        self,
+        ctakes_path: Union[Path, str],
+        api_key: str,
+        max_batch_size: int = 32,
+        max_latency: float = 0.5,
+        max_concurrent_runs: int = 1,
+        piper_path: Union[Path, str] = "./csvbruh.piper",
+    ):
+        self.ctakes_path = ctakes_path
+        self.api_key = api_key
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.piper_path = piper_path
+
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._runs = asyncio.Semaphore(max_concurrent_runs)
+        self._waiting = False
+        self._tasks = set()
+
+    async def index(self, text: str) -> Keywords:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, future))
+
+        # A batch already waiting for a run slot takes the new text along.
+        if not self._waiting:
+            if len(self._pending) >= self.max_batch_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(
+                    self.max_latency, self._flush
+                )
+
+        return await future
+
+    async def index_many(self, texts: List[str]) -> Dict[int, Keywords]:
+        """
+        Same output as `ctakes.index_texts`, but batched with every other caller.
+        """
+        indexed = await asyncio.gather(*[self.index(text) for text in texts])
+        return dict(enumerate(indexed))
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        self._waiting = True
+        task = asyncio.create_task(self._run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self):
+        async with self._runs:
+            self._waiting = False
+            batch = self._pending[: self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size :]
+            # What didn't fit already waited, it goes straight to the next slot.
+            if self._pending:
+                self._flush()
+
+            try:
+                indexed = await index_texts(
+                    [text for text, _ in batch],
+                    self.ctakes_path,
+                    self.api_key,
+                    piper_path=self.piper_path,
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+        for i, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(indexed.get(i, {}))
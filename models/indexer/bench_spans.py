@@ -0,0 +1,90 @@
+"""
+Compares `fix_spans_inplace_regex` with the Aho–Corasick `fix_spans_inplace` on
+synthetic long reports, checking that both assign the same spans.
+
+Run with: python -m models.indexer.bench_spans
+"""
+
+import io
+import random
+import time
+from contextlib import redirect_stdout
+from copy import deepcopy
+from typing import Callable, List
+from .common import CUIInfo, Keywords, Spans, fix_spans_inplace, fix_spans_inplace_regex
+
+WORDS = (
+    "pleural effusion pneumothorax consolidation opacity atelectasis cardiomegaly "
+    "mediastinum hilum trachea diaphragm costophrenic angle nodule mass fracture "
+    "rib clavicle scapula spine edema infiltrate interstitial alveolar bilateral "
+    "left right upper lower lobe lung heart aorta calcification granuloma"
+).split()
+FILLER = "the is no of with and in at on a there mild small moderate severe".split()
+
+
+def make_report(rng: random.Random, length: int) -> str:
+    words = []
+    while sum(map(len, words)) + len(words) < length:
+        words.append(rng.choice(WORDS if rng.random() < 0.4 else FILLER))
+        if rng.random() < 0.08:
+            words[-1] += "."
+    return " ".join(words)
+
+
+def make_keywords(rng: random.Random, count: int) -> Keywords:
+    terms = set()
+    while len(terms) < count:
+        terms.add(" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))))
+
+    # More entries than occurrences, so both versions assign every occurrence.
+    return {
+        term: [CUIInfo([f"C{i:07d}"], False, False, Spans(-1, -1), "Finding")] * 2000
+        for i, term in enumerate(sorted(terms))
+    }
+
+
+def time_it(function: Callable, report: str, keywords: Keywords, repeat: int):
+    copies = [deepcopy(keywords) for _ in range(repeat)]
+    start = time.perf_counter()
+    for copy in copies:
+        function(report, copy, remove_not_found=False)
+    return (time.perf_counter() - start) / repeat, copies[0]
+
+
+def main():
+    rng = random.Random(0)
+    rows: List[str] = []
+
+    # Both versions warn about every term that isn't found, which isn't measured.
+    with redirect_stdout(io.StringIO()):
+        for length, count in (
+            (2_000, 50),
+            (10_000, 200),
+            (50_000, 500),
+            (50_000, 2000),
+        ):
+            report = make_report(rng, length)
+            keywords = make_keywords(rng, count)
+
+            regex_time, regex_result = time_it(
+                fix_spans_inplace_regex, report, keywords, 5
+            )
+            automaton_time, automaton_result = time_it(
+                fix_spans_inplace, report, keywords, 5
+            )
+
+            rows.append(
+                f"{length:>8} {count:>9} {regex_time * 1000:>10.1f} "
+                f"{automaton_time * 1000:>10.1f} {regex_time / automaton_time:>8.1f}x "
+                f"{'yes' if regex_result == automaton_result else 'NO':>6}"
+            )
+
+    print(
+        f"{'chars':>8} {'keywords':>9} {'regex ms':>10} {'aho ms':>10} {'speedup':>9} {'same':>6}"
+    )
+    for row in rows:
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
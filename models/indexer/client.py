@@ -1,12 +1,145 @@
-import requests
+import contextvars
+import importlib.util
+import json
 import httpx
-from typing import Dict, Optional
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Iterator, NamedTuple, Optional
+
+_usage = contextvars.ContextVar("llm_token_usage", default=None)
 
 
 def strip_think(text: str) -> str:
     return text.split("</think>")[-1]
 
 
+class ThinkStripper:
+    """
+    Streaming counterpart of `strip_think`. Holds tokens back while the output may
+    still be a reasoning block, then lets the answer through without its leading
+    whitespace.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.passing = False
+        self.started = False
+
+    def feed(self, token: str) -> str:
+        if not self.passing:
+            self.buffer += token
+            head = self.buffer.lstrip()
+
+            if head.startswith("<think>"):
+                if "</think>" not in head:
+                    return ""
+                token = strip_think(head)
+            elif "<think>".startswith(head):
+                return ""
+            else:
+                token = head
+
+            self.passing = True
+            self.buffer = ""
+
+        if not self.started:
+            token = token.lstrip()
+            self.started = bool(token)
+
+        return token
+
+    def flush(self) -> str:
+        """
+        Whatever was held back when the stream ended, e.g. an unterminated block.
+        """
+        rest, self.buffer = self.buffer, ""
+        return strip_think(rest).strip()
+
+
+class TokenUsage:
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def to_dict(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+@contextmanager
+def counting_tokens() -> Iterator[TokenUsage]:
+    """
+    Adds up the tokens of every LLM request answered inside, as reported by the
+    server. Answers that never reach the server, e.g. cached ones, cost nothing.
+    """
+    usage = TokenUsage()
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+def record_usage(prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+    usage = _usage.get()
+    if usage is not None:
+        usage.requests += 1
+        usage.prompt_tokens += prompt_tokens or 0
+        usage.completion_tokens += completion_tokens or 0
+
+
+@lru_cache(maxsize=1)
+def has_h2() -> bool:
+    if importlib.util.find_spec("h2") is None:
+        print("[WARNING] http2 needs the h2 package. Falling back to HTTP/1.1.")
+        return False
+    return True
+
+
+class PoolConfig(NamedTuple):
+    """
+    Connection pool shared by every request of a client. `http2` is only used when
+    the `h2` package is installed, and only over https, where the backend can
+    negotiate it.
+    """
+
+    max_connections: int = 16
+    max_keepalive_connections: int = 8
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+    timeout: float = 120.0
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def use_http2(self) -> bool:
+        return self.http2 and has_h2()
+
+    def create_client(self, **kwargs) -> httpx.Client:
+        return httpx.Client(
+            limits=self.limits(),
+            http2=self.use_http2(),
+            timeout=httpx.Timeout(self.timeout),
+            **kwargs,
+        )
+
+    def create_async_client(self, **kwargs) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            limits=self.limits(),
+            http2=self.use_http2(),
+            timeout=httpx.Timeout(self.timeout),
+            **kwargs,
+        )
+
+
 class ClientBase:
     def query(
         self, user_prompt: str, system_prompt: str, verbose: bool, **use_options
@@ -15,13 +148,49 @@ class ClientBase:
         self, user_prompt: str, system_prompt: str, verbose: bool, **use_options
     ) -> str: ...
 
+    async def async_stream(
+        self, user_prompt: str, system_prompt: str, verbose: bool, **use_options
+    ) -> AsyncIterator[str]:
+        """
+        Yields the answer as it's generated. Clients without streaming support
+        yield it whole.
+        """
+        yield await self.async_query(
+            user_prompt, system_prompt, verbose=verbose, **use_options
+        )
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        """
+        Releases the pooled connections. Meant for the app's shutdown.
+        """
+        self.close()
+
 
 class OllamaClient(ClientBase):
-    def __init__(self, model: str, url: str = "http://localhost:11434/api/chat"):
+    def __init__(
+        self,
+        model: str,
+        url: str = "http://localhost:11434/api/chat",
+        pool: Optional[PoolConfig] = None,
+    ):
         super().__init__()
         self.url = url
         self.model = model
 
+        pool = pool or PoolConfig()
+        self.http = pool.create_client()
+        self.async_http = pool.create_async_client()
+
+    def close(self):
+        self.http.close()
+
+    async def aclose(self):
+        self.close()
+        await self.async_http.aclose()
+
     def query(
         self,
         user_prompt: str,
@@ -43,10 +212,11 @@ class OllamaClient(ClientBase):
         if format_obj is not None:
             payload["format"] = {"type": "object", **format_obj}
 
-        response = requests.post(self.url, json=payload)
+        response = self.http.post(self.url, json=payload)
         response.raise_for_status()
 
         data = response.json()
+        record_usage(data.get("prompt_eval_count"), data.get("eval_count"))
         output = data.get("message", {}).get("content", "")
 
         return output.strip() if verbose else strip_think(output).strip()
@@ -72,17 +242,59 @@ class OllamaClient(ClientBase):
         if format_obj is not None:
             payload["format"] = {"type": "object", **format_obj}
 
-        timeout = httpx.Timeout(120.0)
-
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.post(self.url, json=payload)
-            response.raise_for_status()
-            data = response.json()
+        response = await self.async_http.post(self.url, json=payload)
+        response.raise_for_status()
+        data = response.json()
+        record_usage(data.get("prompt_eval_count"), data.get("eval_count"))
 
         output = data.get("message", {}).get("content", "")
 
         return output.strip() if verbose else strip_think(output).strip()
 
+    async def async_stream(
+        self,
+        user_prompt: str,
+        system_prompt: str,
+        options: Dict = {},
+        format_obj: Optional[Dict] = None,
+        verbose: bool = False,
+    ) -> AsyncIterator[str]:
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            "options": options,
+            "stream": True,
+        }
+
+        if format_obj is not None:
+            payload["format"] = {"type": "object", **format_obj}
+
+        stripper = None if verbose else ThinkStripper()
+
+        async with self.async_http.stream("POST", self.url, json=payload) as response:
+            response.raise_for_status()
+
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+
+                data = json.loads(line)
+                token = data.get("message", {}).get("content", "")
+                if stripper is not None:
+                    token = stripper.feed(token)
+                if token:
+                    yield token
+
+                if data.get("done"):
+                    record_usage(data.get("prompt_eval_count"), data.get("eval_count"))
+                    break
+
+        if stripper is not None and (rest := stripper.flush()):
+            yield rest
+
 
 class OpenAIClient(ClientBase):
     def __init__(
@@ -90,14 +302,35 @@ class OpenAIClient(ClientBase):
         model: str,
         url: str = "http://localhost:8000/v1",
         api_key: str = "not-needed",
+        pool: Optional[PoolConfig] = None,
     ):
         from openai import OpenAI, AsyncOpenAI
 
         super().__init__()
-        self.client = OpenAI(base_url=url, api_key=api_key)
-        self.async_client = AsyncOpenAI(base_url=url, api_key=api_key)
+        pool = pool or PoolConfig()
+        # Requests go straight through the pooled clients, so they carry the key.
+        headers = {"Authorization": f"Bearer {api_key}"}
+        self.client = OpenAI(
+            base_url=url,
+            api_key=api_key,
+            timeout=pool.timeout,
+            http_client=pool.create_client(base_url=url, headers=headers),
+        )
+        self.async_client = AsyncOpenAI(
+            base_url=url,
+            api_key=api_key,
+            timeout=pool.timeout,
+            http_client=pool.create_async_client(base_url=url, headers=headers),
+        )
         self.model = model
 
+    def close(self):
+        self.client.close()
+
+    async def aclose(self):
+        self.close()
+        await self.async_client.close()
+
     def query(
         self,
         user_prompt: str,
@@ -122,6 +355,8 @@ class OpenAIClient(ClientBase):
             method="POST", url="/chat/completions", json=request_body
         )
         response = raw_response.json()
+        usage = response.get("usage") or {}
+        record_usage(usage.get("prompt_tokens"), usage.get("completion_tokens"))
 
         output = response["choices"][0]["message"]["content"]
 
@@ -150,17 +385,80 @@ class OpenAIClient(ClientBase):
         if format_obj is not None:
             request_body["extra_body"] = {"guided_json": format_obj}
 
-        response = await self.client.chat.completions.create(**request_body)
-        output = response.choices[0].message.content
+        raw_response = await self.async_client._client.request(
+            method="POST", url="/chat/completions", json=request_body
+        )
+        response = raw_response.json()
+        usage = response.get("usage") or {}
+        record_usage(usage.get("prompt_tokens"), usage.get("completion_tokens"))
+
+        output = response["choices"][0]["message"]["content"]
 
         return output if verbose else strip_think(output)
 
+    async def async_stream(
+        self,
+        user_prompt: str,
+        system_prompt: str,
+        options: Dict = {},
+        format_obj: Optional[Dict] = None,
+        verbose: bool = False,
+    ) -> AsyncIterator[str]:
+        request_body = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            "stream": True,
+            **options,
+        }
+
+        if format_obj is not None:
+            request_body["extra_body"] = {"guided_json": format_obj}
+
+        stripper = None if verbose else ThinkStripper()
+
+        async with self.async_client._client.stream(
+            "POST", "/chat/completions", json=request_body
+        ) as response:
+            response.raise_for_status()
+
+            # Server-sent events, one "data: {...}" line per chunk.
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+
+                data = line[len("data:") :].strip()
+                if data == "[DONE]":
+                    break
+
+                chunk = json.loads(data)
+                # Only sent by servers that report usage on streams, in the last chunk.
+                if usage := chunk.get("usage"):
+                    record_usage(
+                        usage.get("prompt_tokens"), usage.get("completion_tokens")
+                    )
+
+                choices = chunk.get("choices") or [{}]
+                token = choices[0].get("delta", {}).get("content") or ""
+                if stripper is not None:
+                    token = stripper.feed(token)
+                if token:
+                    yield token
+
+        if stripper is not None and (rest := stripper.flush()):
+            yield rest
+
 
 class Qwen3OllamaClient(OllamaClient):
     def __init__(
-        self, url: str = "http://localhost:11434/api/chat", model: str = "qwen3:8b"
+        self,
+        url: str = "http://localhost:11434/api/chat",
+        model: str = "qwen3:8b",
+        pool: Optional[PoolConfig] = None,
     ):
-        super().__init__(url=url, model=model)
+        super().__init__(url=url, model=model, pool=pool)
 
     def query(
         self, user_prompt: str, system_prompt: str, verbose: bool = False, **use_options
@@ -202,6 +500,27 @@ class Qwen3OllamaClient(OllamaClient):
             verbose=verbose,
         )
 
+    async def async_stream(
+        self, user_prompt: str, system_prompt: str, verbose: bool = False, **use_options
+    ) -> AsyncIterator[str]:
+        options = {
+            "temperature": use_options.get("temperature", 0.7),
+            "top_p": 0.8,
+            "top_k": 20,
+            "presence_penalty": 1.5,
+            "mirostat": 0,
+            "frequency_penalty": 0.0,
+        }
+
+        async for token in super().async_stream(
+            user_prompt=user_prompt,
+            system_prompt=system_prompt,
+            options=options,
+            format_obj=use_options.get("format_obj"),
+            verbose=verbose,
+        ):
+            yield token
+
 
 class Qwen3OpenAiClient(OpenAIClient):
 
@@ -210,10 +529,9 @@ class Qwen3OpenAiClient(OpenAIClient):
         model: str,
         url: str = "http://localhost:8000/v1",
         api_key: str = "not-needed",
+        pool: Optional[PoolConfig] = None,
     ):
-        from openai import OpenAI
-
-        super().__init__(model=model, url=url, api_key=api_key)
+        super().__init__(model=model, url=url, api_key=api_key, pool=pool)
 
     def query(
         self, user_prompt: str, system_prompt: str, verbose: bool = False, **use_options
@@ -253,6 +571,26 @@ class Qwen3OpenAiClient(OpenAIClient):
             verbose=verbose,
         )
 
+    async def async_stream(
+        self, user_prompt: str, system_prompt: str, verbose: bool = False, **use_options
+    ) -> AsyncIterator[str]:
+        options = {
+            "temperature": use_options.get("temperature", 0.7),
+            "top_p": 0.8,
+            "top_k": 20,
+            "min_p": 0,
+            "presence_penalty": 1.5,
+        }
+
+        async for token in super().async_stream(
+            user_prompt=user_prompt,
+            system_prompt=system_prompt,
+            options=options,
+            format_obj=use_options.get("format_obj"),
+            verbose=verbose,
+        ):
+            yield token
+
 
 class GptOssClient(OpenAIClient):
     def __init__(
@@ -260,14 +598,15 @@ class GptOssClient(OpenAIClient):
         model: str,
         url: str = "http://localhost:8000/v1",
         api_key: str = "not-needed",
+        pool: Optional[PoolConfig] = None,
     ):
-        super().__init__(model=model, url=url, api_key=api_key)
+        super().__init__(model=model, url=url, api_key=api_key, pool=pool)
 
     def query(
         self, user_prompt: str, system_prompt: str, verbose: bool = False, **use_options
     ):
         options = {
-            "temperature": user_prompt.get("temperature", 1.0),
+            "temperature": use_options.get("temperature", 1.0),
             "top_p": 1.0,
         }
 
@@ -283,7 +622,7 @@ class GptOssClient(OpenAIClient):
         self, user_prompt: str, system_prompt: str, verbose: bool = False, **use_options
     ):
         options = {
-            "temperature": user_prompt.get("temperature", 1.0),
+            "temperature": use_options.get("temperature", 1.0),
             "top_p": 1.0,
         }
 
@@ -294,3 +633,20 @@ class GptOssClient(OpenAIClient):
             format_obj=use_options.get("format_obj"),
             verbose=verbose,
         )
+
+    async def async_stream(
+        self, user_prompt: str, system_prompt: str, verbose: bool = False, **use_options
+    ) -> AsyncIterator[str]:
+        options = {
+            "temperature": use_options.get("temperature", 1.0),
+            "top_p": 1.0,
+        }
+
+        async for token in super().async_stream(
+            user_prompt=user_prompt,
+            system_prompt=system_prompt,
+            options=options,
+            format_obj=use_options.get("format_obj"),
+            verbose=verbose,
+        ):
+            yield token
@@ -1,5 +1,5 @@
 import regex as re
-from typing import NamedTuple, Union, List, Dict, TypedDict, Tuple
+from typing import NamedTuple, Union, List, Dict, TypedDict, Tuple, Iterator
 
 
 CUI = str
@@ -146,6 +146,130 @@ def fix_spans_inplace_regex(
             del keywords[not_found_matches]
 
 
+class AhoCorasick:
+    """
+    Automaton over a fixed list of patterns that finds every occurrence of all of
+    them in a single pass over the text, however many patterns there are.
+    """
+
+    def __init__(self, patterns: List[str]):
+        self.patterns = patterns
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        # Patterns ending at each node, its own and those of its suffixes.
+        self.output: List[List[int]] = [[]]
+
+        for index, pattern in enumerate(patterns):
+            if not pattern:
+                continue
+
+            node = 0
+            for char in pattern:
+                next_node = self.goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto[node][char] = next_node
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                node = next_node
+            self.output[node].append(index)
+
+        # Breadth first, so the fail link of a node is ready before its children's.
+        queue = list(self.goto[0].values())
+        for node in queue:
+            for char, child in self.goto[node].items():
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+                queue.append(child)
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        Yields `(start, pattern index)` for every occurrence, overlapping ones
+        included, in the order their ends are reached.
+        """
+        goto, fail, output, patterns = self.goto, self.fail, self.output, self.patterns
+        node = 0
+
+        for position, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+
+            for index in output[node]:
+                yield position - len(patterns[index]) + 1, index
+
+    def first_alternatives(
+        self, text: str, overlapped: bool = True
+    ) -> List[Tuple[int, int]]:
+        """
+        The `(start, pattern index)` pairs a regex alternation of the patterns, in
+        the same order, would report: at each start the first pattern that matches
+        there. Without `overlapped`, the search resumes after each match.
+        """
+        best: Dict[int, int] = {}
+        for start, index in self.iter_matches(text):
+            if index < best.get(start, len(self.patterns)):
+                best[start] = index
+
+        matches = []
+        resume = 0
+        for start in sorted(best):
+            if not overlapped and start < resume:
+                continue
+            matches.append((start, best[start]))
+            resume = start + len(self.patterns[best[start]])
+
+        return matches
+
+
+def fix_spans_inplace(
+    origin: str,
+    keywords: Keywords,
+    use_lowercase: bool = True,
+    overlapped: bool = True,
+    remove_not_found: bool = True,
+):
+    """
+    Same contract as `fix_spans_inplace_regex`, found with a single Aho–Corasick
+    pass instead of compiling and running an alternation of every keyword.
+
+    With `use_lowercase`, the matches are mapped back to the keywords as they are
+    written, so keys with capitals get their spans too. Occurrences past the number
+    of `CUIInfo` entries of a keyword are left alone.
+    """
+    keys = list(keywords.keys())
+    patterns = keys
+    if use_lowercase:
+        patterns = [k.lower() for k in keys]
+        origin = origin.lower()
+
+    automaton = AhoCorasick(patterns)
+    last_position: Dict[str, int] = {}
+
+    for pos, index in automaton.first_alternatives(origin, overlapped):
+        key = keys[index]
+        position = last_position.setdefault(key, 0)
+
+        if position < len(keywords[key]):
+            keywords[key][position] = keywords[key][position]._replace(
+                spans=Spans(pos, pos + len(patterns[index]))
+            )
+            last_position[key] += 1
+        elif not overlapped:
+            print(f"[WARNING] The term '{key}' was out of bounds!")
+
+    for key in keys:
+        if key in last_position:
+            continue
+        print(f"[WARNING] The term '{key}' was not found!")
+        if remove_not_found:
+            del keywords[key]
+
+
 class PairedText(NamedTuple):
     original: str
     match: str
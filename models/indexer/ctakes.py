@@ -1,10 +1,11 @@
+import csv
 import glob
 import os
 import asyncio
-import pandas as pd
-from typing import NamedTuple, Union, List, Dict
+import tempfile
+from typing import NamedTuple, Union, List, Dict, Optional, Iterator, Tuple
 from pathlib import Path
-from .common import Keywords, CUIInfo, Spans, fix_spans_inplace_regex
+from .common import Keywords, CUIInfo, Spans, fix_spans_inplace
 
 
 class cTakePaths(NamedTuple):
@@ -43,6 +44,24 @@ def find_ctakes_home_folder(ctakes_path: Path) -> Path:
     ).parent
 
 
+def find_ctakes_shell(ctakes_path: Path) -> Path:
+    paths = find_ctakes_shells(ctakes_path)
+
+    if os.name == "nt":
+        return paths.windows_path
+    elif os.name == "posix":
+        return paths.unix_path
+
+    print("[WARNING] Unknown OS. Assuming POSIX-like.")
+    return paths.unix_path
+
+
+def ctakes_environment(ctakes_path: Path) -> Dict[str, str]:
+    env = os.environ.copy()
+    env["CTAKES_HOME"] = str(find_ctakes_home_folder(ctakes_path).absolute())
+    return env
+
+
 async def run_ctakes(
     ctakes_path: Union[Path, str],
     input_path: Union[Path, str],
@@ -55,20 +74,8 @@ async def run_ctakes(
     output_path = Path(output_path)
     piper_path = Path(piper_path)
 
-    ctake_shell = Path()
-    paths = find_ctakes_shells(ctakes_path)
-    home = find_ctakes_home_folder(ctakes_path)
-
-    if os.name == "nt":
-        ctake_shell = paths.windows_path
-    elif os.name == "posix":
-        ctake_shell = paths.unix_path
-    else:
-        print("[WARNING] Unknown OS. Assuming POSIX-like.")
-        ctake_shell = paths.unix_path
-
-    env = os.environ.copy()
-    env["CTAKES_HOME"] = str(home.absolute())
+    ctake_shell = find_ctakes_shell(ctakes_path)
+    env = ctakes_environment(ctakes_path)
 
     command = (
         f"{ctake_shell.absolute()} "
@@ -99,7 +106,7 @@ def get_number(s: str) -> int:
     pos = s.find("_")
     if pos == -1:
         raise ValueError(
-            "In the ./input folder there are named files that weren't created by this script! Clean them!"
+            "In the input folder there are named files that weren't created by this script! Clean them!"
         )
 
     return int(s[:pos])
@@ -124,66 +131,120 @@ def extract_spans(text: str) -> Spans:
     return Spans(int(start), int(end))
 
 
-def extract_keywords(filepath: Path) -> Keywords:
-    df = pd.read_csv(filepath, delimiter="|")[
-        [
-            " Document Text ",
-            " Semantic Group ",
-            " Span ",
-            " Negated ",
-            " Uncertain ",
-            " CUI ",
-        ]
-    ].dropna(subset=[" CUI "])
+TABLE_COLUMNS = (
+    "Document Text",
+    "Semantic Group",
+    "Span",
+    "Negated",
+    "Uncertain",
+    "CUI",
+)
 
-    keywords: Keywords = {}
 
-    for _, row in df.iterrows():
-        text = row[" Document Text "].strip()
-        keyword_list = keywords.setdefault(text, [])
-
-        keyword_list.append(
-            CUIInfo(
-                row[" CUI "].split(";"),
-                row[" Negated "],
-                row[" Uncertain "],
-                extract_spans(row[" Span "]),
-                row[" Semantic Group "],
+def iter_table_rows(filepath: Path) -> Iterator[Tuple[str, CUIInfo]]:
+    """
+    Streams the `(document text, CUIInfo)` rows of a cTAKES BSV table, skipping the
+    rows without a CUI.
+
+    Cells come space padded (`" true "`), so every one is stripped and the negated
+    and uncertain columns become real booleans.
+    """
+    with open(filepath, "r", encoding="utf-8", newline="") as file:
+        reader = csv.reader(file, delimiter="|", quoting=csv.QUOTE_NONE)
+
+        header = [name.strip() for name in next(reader, [])]
+        try:
+            text_i, group_i, span_i, negated_i, uncertain_i, cui_i = (
+                header.index(name) for name in TABLE_COLUMNS
+            )
+        except ValueError:
+            raise ValueError(f"{filepath} isn't a cTAKES semantic table.")
+
+        for row in reader:
+            if len(row) <= max(text_i, group_i, span_i, negated_i, uncertain_i, cui_i):
+                continue
+
+            cuis = row[cui_i].strip()
+            if not cuis:
+                continue
+
+            yield row[text_i].strip(), CUIInfo(
+                [cui.strip() for cui in cuis.split(";")],
+                row[negated_i].strip().lower() == "true",
+                row[uncertain_i].strip().lower() == "true",
+                extract_spans(row[span_i]),
+                row[group_i].strip(),
             )
-        )
+
+
+def extract_keywords(filepath: Path) -> Keywords:
+    keywords: Keywords = {}
+
+    for text, info in iter_table_rows(filepath):
+        keywords.setdefault(text, []).append(info)
 
     return keywords
 
 
+def read_table(table_path: Path, text: str) -> Keywords:
+    keywords = extract_keywords(table_path)
+    fix_spans_inplace(
+        text,
+        keywords,
+        use_lowercase=False,
+        remove_not_found=False,
+    )
+    return keywords
+
+
 async def index_texts(
-    texts: List[str], ctakes_path: Union[Path, str], api_key: str
+    texts: List[str],
+    ctakes_path: Union[Path, str],
+    api_key: str,
+    workdir: Optional[Union[Path, str]] = None,
+    piper_path: Union[Path, str] = "./csvbruh.piper",
 ) -> Dict[int, Keywords]:
-    os.makedirs("./input", exist_ok=True)
-    os.makedirs("./output", exist_ok=True)
+    """
+    Runs cTAKES over `texts` and returns the keywords found in each of them, by index.
 
-    for i, text in enumerate(texts):
-        create_file(Path(f"./input/{i}.txt"), text)
+    Every call works in its own temporary directory unless `workdir` is given, so
+    concurrent calls don't overwrite each other's files.
+    """
+    if workdir is None:
+        with tempfile.TemporaryDirectory(prefix="ctakes_") as tmp:
+            return await index_texts(texts, ctakes_path, api_key, tmp, piper_path)
 
-    await run_ctakes(ctakes_path, "./input", "./output", "./csvbruh.piper", api_key)
+    input_path = Path(workdir).joinpath("input")
+    output_path = Path(workdir).joinpath("output")
+    os.makedirs(input_path, exist_ok=True)
+    os.makedirs(output_path, exist_ok=True)
 
-    tables = get_tables_paths(Path("./output"))
-    indexed_table = {}
-    for table in tables:
+    for i, text in enumerate(texts):
+        create_file(input_path.joinpath(f"{i}.txt"), text)
 
-        if len(texts) <= table.original_number:
-            continue
+    await run_ctakes(ctakes_path, input_path, output_path, piper_path, api_key)
 
-        keywords = extract_keywords(table.table_path)
-        fix_spans_inplace_regex(
-            texts[table.original_number],
-            keywords,
-            use_lowercase=False,
-            remove_not_found=False,
-        )
+    tables = [
+        table
+        for table in get_tables_paths(output_path)
+        if table.original_number < len(texts)
+    ]
 
-        indexed_table[table.original_number] = keywords
+    # Big batches leave hundreds of tables behind, they're read concurrently and
+    # off the event loop.
+    keywords = await asyncio.gather(
+        *[
+            asyncio.to_thread(
+                read_table, table.table_path, texts[table.original_number]
+            )
+            for table in tables
+        ]
+    )
 
-    return indexed_table
+    return {
+        table.original_number: table_keywords
+        for table, table_keywords in zip(tables, keywords)
+    }
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
-from typing import List
+from functools import lru_cache
+from typing import Dict, List
 from rapidfuzz import fuzz, process, utils
 from .common import Keywords
 
@@ -34,6 +35,61 @@ def fix_sentence(
     return " ".join([fix_part(part, words_set, threshold) for part in parts])
 
 
+class SpellChecker:
+    """
+    `fix_sentence` against the words of a single document, with the vocabulary
+    processed once. Every word not corrected yet is scored against it in a single
+    `process.cdist` call, and corrections are remembered for the next sentences.
+
+    Picks the same words as `fix_part`: the highest `fuzz.QRatio`, the first one on
+    ties.
+    """
+
+    def __init__(self, text: str, threshold: float = 0.6, workers: int = -1):
+        self.words_set = create_set_from_text(text)
+        self.threshold = threshold
+        self.workers = workers
+        self._fixed: Dict[str, str] = {}
+
+    def fix_parts(self, parts: List[str]) -> List[str]:
+        unseen = [part for part in dict.fromkeys(parts) if part not in self._fixed]
+
+        if unseen and self.words_set:
+            # The words are already processed by `create_set_from_text`.
+            scores = process.cdist(
+                [utils.default_process(part) for part in unseen],
+                self.words_set,
+                scorer=fuzz.QRatio,
+                workers=self.workers,
+            )
+            for part, row, best in zip(unseen, scores, scores.argmax(axis=1)):
+                self._fixed[part] = (
+                    self.words_set[best] if row[best] >= self.threshold else part
+                )
+        else:
+            self._fixed.update((part, part) for part in unseen)
+
+        return [self._fixed[part] for part in parts]
+
+    def fix_sentences(
+        self, sentences: List[str], match_whole: bool = False
+    ) -> List[str]:
+        if match_whole:
+            return self.fix_parts(sentences)
+
+        split = [sentence.split() for sentence in sentences]
+        fixed = iter(self.fix_parts([part for parts in split for part in parts]))
+        return [" ".join(next(fixed) for _ in parts) for parts in split]
+
+
+@lru_cache(maxsize=64)
+def document_spell_checker(text: str) -> SpellChecker:
+    """
+    Shared by every matching attempt on the same document.
+    """
+    return SpellChecker(text)
+
+
 if __name__ == "__main__":
     text = """While others practiced their fire-breathing on boulders and trees, Flame tiptoed through meadows, gently sniffing daisies, tulips, and especially peonies — his favorite. His fire was so gentle that it never burned anything — it just gave the flowers a little warmth to help them grow.
 One day, while tending his garden, Flame heard a tiny sniffle. Behind a bush, he found a little girl named Elia, crying because her village's crops wouldn't grow.
@@ -49,3 +105,4 @@ And though he had no pile of gold or fearsome roar, Flame was the happiest drago
     word_set = create_set_from_text(text)
 
     print(fix_sentence(sentece, word_set))
+    print(SpellChecker(text).fix_sentences([sentece]))
@@ -0,0 +1,246 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, Union
+from .client import ClientBase
+
+_refreshing = contextvars.ContextVar("llm_cache_refreshing", default=False)
+
+
+@contextmanager
+def refreshing_cache():
+    """
+    LLM calls made inside skip the cached answers and overwrite them, e.g. when a
+    retry is needed because the cached answer was unusable.
+    """
+    token = _refreshing.set(True)
+    try:
+        yield
+    finally:
+        _refreshing.reset(token)
+
+
+class LLMCache:
+    """
+    SQLite store of LLM answers, evicting the least recently used ones once it holds
+    more than `max_entries` answers or `max_bytes` of text.
+
+    The number of answers and their size are counted once at open and then kept up
+    to date in memory, so a `put` never scans the table.
+    """
+
+    def __init__(
+        self,
+        path: Union[Path, str] = "llm_cache.sqlite3",
+        max_entries: int = 100_000,
+        max_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS answers_accessed ON answers (accessed)"
+            )
+            self._entries, self._bytes = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers"
+            ).fetchone()
+
+    @staticmethod
+    def make_key(**parts) -> str:
+        encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.blake2b(encoded.encode("utf-8"), digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT value FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._db.execute(
+                "UPDATE answers SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        with self._lock, self._db:
+            replaced = self._db.execute(
+                "SELECT size FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            if replaced is None:
+                self._entries += 1
+            else:
+                self._bytes -= replaced[0]
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self._entries > self.max_entries or self._bytes > self.max_bytes:
+            # Oldest first, in chunks, so a big overflow isn't one row at a time.
+            rows = self._db.execute(
+                "SELECT key, size FROM answers ORDER BY accessed LIMIT ?",
+                (max(self._entries - self.max_entries, 64),),
+            ).fetchall()
+            if not rows:
+                # The totals drifted, e.g. another process shares the file.
+                self._entries = self._bytes = 0
+                break
+
+            for key, size in rows:
+                if self._entries <= self.max_entries and self._bytes <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM answers WHERE key = ?", (key,))
+                self._entries -= 1
+                self._bytes -= size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM answers")
+            self._entries = self._bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, total = self._entries, self._bytes
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class CachedClient(ClientBase):
+    """
+    Wraps a client so identical requests are answered from `cache`. Entries are
+    keyed by the client class and model, both prompts and the request options.
+
+    With `deterministic` every request is sent with temperature 0, so the cached
+    answer is the one the model would give again.
+    """
+
+    def __init__(self, client: ClientBase, cache: LLMCache, deterministic: bool = True):
+        super().__init__()
+        self.client = client
+        self.cache = cache
+        self.deterministic = deterministic
+
+    def _options(self, use_options: Dict) -> Dict:
+        if self.deterministic:
+            return {**use_options, "temperature": 0.0}
+        return use_options
+
+    def _key(
+        self, user_prompt: str, system_prompt: str, verbose: bool, use_options: Dict
+    ) -> str:
+        return LLMCache.make_key(
+            client=type(self.client).__name__,
+            model=getattr(self.client, "model", None),
+            user_prompt=user_prompt,
+            system_prompt=system_prompt,
+            verbose=verbose,
+            options=use_options,
+        )
+
+    def query(
+        self, user_prompt: str, system_prompt: str, verbose: bool = False, **use_options
+    ) -> str:
+        use_options = self._options(use_options)
+        key = self._key(user_prompt, system_prompt, verbose, use_options)
+
+        if not _refreshing.get() and (output := self.cache.get(key)) is not None:
+            return output
+
+        output = self.client.query(
+            user_prompt, system_prompt, verbose=verbose, **use_options
+        )
+        self.cache.put(key, output)
+        return output
+
+    async def async_query(
+        self, user_prompt: str, system_prompt: str, verbose: bool = False, **use_options
+    ) -> str:
+        use_options = self._options(use_options)
+        key = self._key(user_prompt, system_prompt, verbose, use_options)
+
+        if not _refreshing.get():
+            output = await asyncio.to_thread(self.cache.get, key)
+            if output is not None:
+                return output
+
+        output = await self.client.async_query(
+            user_prompt, system_prompt, verbose=verbose, **use_options
+        )
+        await asyncio.to_thread(self.cache.put, key, output)
+        return output
+
+    async def async_stream(
+        self, user_prompt: str, system_prompt: str, verbose: bool = False, **use_options
+    ) -> AsyncIterator[str]:
+        use_options = self._options(use_options)
+        key = self._key(user_prompt, system_prompt, verbose, use_options)
+
+        if not _refreshing.get():
+            output = await asyncio.to_thread(self.cache.get, key)
+            if output is not None:
+                yield output
+                return
+
+        tokens = []
+        async for token in self.client.async_stream(
+            user_prompt, system_prompt, verbose=verbose, **use_options
+        ):
+            tokens.append(token)
+            yield token
+
+        # Only complete answers are stored, an abandoned stream never gets here.
+        await asyncio.to_thread(self.cache.put, key, "".join(tokens).strip())
+
+    def close(self):
+        self.client.close()
+        self.cache.close()
+
+    async def aclose(self):
+        await self.client.aclose()
+        self.cache.close()
@@ -1,16 +1,27 @@
-from typing import List, Tuple, Dict
-from .client import ClientBase
-from .dictionary import create_set_from_text, fix_sentence
+import asyncio
+import re
+import httpx
+from typing import Awaitable, Callable, List, NamedTuple, Optional, Tuple, Dict
+from .client import ClientBase, counting_tokens
+from .llm_cache import refreshing_cache
+from .dictionary import document_spell_checker
 from .common import (
     Keywords,
     CUIInfo,
     Spans,
     PairedText,
     strip_cui,
-    fix_spans_inplace_regex,
+    fix_spans_inplace,
 )
 import logging
 import json
+from contextlib import nullcontext
+
+SENTENCE = re.compile(r"[^.!?;\n]+[.!?;]*")
+# What a request can fail with before there's a usable answer: timeouts, HTTP and
+# connection errors, and answers that aren't the expected JSON object of strings
+# (json.JSONDecodeError is a ValueError). Anything else is a bug and propagates.
+MATCH_ERRORS = (asyncio.TimeoutError, httpx.HTTPError, ValueError)
 
 SYS_PROMPT = """You're being given 2 reports, one of them is the original report in portuguese while the other is a translated version in english.
 Your job is to correlate important words, or phrases, from the english one to the portuguese one.
@@ -83,6 +94,11 @@ def filter_garbage(s: str) -> str:
 def format_json_into_desired_answer(text: str) -> List[PairedText]:
     obj = json.loads(text)
 
+    if not isinstance(obj, dict):
+        raise ValueError(f"Expected a JSON object, got {type(obj).__name__}.")
+    if not all(isinstance(v, str) for v in obj.values()):
+        raise ValueError("Every matched term must be a string.")
+
     seq = []
     for translated_phrase, original_phrase in obj.items():
         translated_phrase = filter_garbage(translated_phrase)
@@ -93,17 +109,12 @@ def format_json_into_desired_answer(text: str) -> List[PairedText]:
 
 
 def spell_check_pairs(original_text: str, pairs: List[PairedText]) -> PairedText:
-    original_words_set = create_set_from_text(original_text)
-    new_pairs = [None for i in range(len(pairs))]
-
-    for i, pair in enumerate(pairs):
-        original, match = pair.original, pair.match
-
-        original = fix_sentence(original, original_words_set)
+    checker = document_spell_checker(original_text)
+    originals = checker.fix_sentences([pair.original for pair in pairs])
 
-        new_pairs[i] = PairedText(original, match)
-
-    return new_pairs
+    return [
+        PairedText(original, pair.match) for original, pair in zip(originals, pairs)
+    ]
 
 
 def fuse_pairs_and_keywords(pairs: List[PairedText], keywords: Keywords) -> Keywords:
@@ -121,16 +132,14 @@ def fuse_pairs_and_keywords(pairs: List[PairedText], keywords: Keywords) -> Keyw
     return new_keywords
 
 
-async def match_keywords(
+async def query_pairs(
     client: ClientBase,
     original_text: str,
     translated_text: str,
-    keywords: Keywords,
+    targets: List[str],
     verbose: bool = False,
-) -> Keywords:
-    just_keywords = strip_cui(keywords)
-
-    target_words = str(just_keywords)[1:-1]
+) -> List[PairedText]:
+    target_words = str(targets)[1:-1]
 
     prompt = f"""- Original: [{original_text}]
 
@@ -140,20 +149,152 @@ async def match_keywords(
 
 JSON Correlated Terms:"""
 
-    pairs = format_json_into_desired_answer(
+    return format_json_into_desired_answer(
         await client.async_query(
             prompt,
             SYS_PROMPT,
             verbose=verbose,
-            format_obj=create_json_skeleton(just_keywords),
+            format_obj=create_json_skeleton(targets),
             temperature=0.1,
         )
     )
 
+
+def resolve_pairs(
+    original_text: str, pairs: List[PairedText], keywords: Keywords
+) -> Keywords:
     pairs = spell_check_pairs(original_text, pairs)
 
     new_keywords = fuse_pairs_and_keywords(pairs, keywords)
 
-    fix_spans_inplace_regex(original_text, new_keywords)
+    fix_spans_inplace(original_text, new_keywords)
 
     return new_keywords
+
+
+async def match_keywords(
+    client: ClientBase,
+    original_text: str,
+    translated_text: str,
+    keywords: Keywords,
+    verbose: bool = False,
+) -> Keywords:
+    pairs = await query_pairs(
+        client, original_text, translated_text, strip_cui(keywords), verbose
+    )
+
+    return resolve_pairs(original_text, pairs, keywords)
+
+
+class RepairPolicy(NamedTuple):
+    max_attempts: int = 4
+    timeout: float = 120.0
+    backoff: float = 1.0
+    max_backoff: float = 8.0
+
+    def delay(self, failures: int) -> float:
+        return min(self.backoff * 2 ** (failures - 1), self.max_backoff)
+
+
+def sentences_with(text: str, terms: List[str]) -> str:
+    """
+    The sentences of `text` where any of `terms` appears, or all of it if none does.
+    """
+    lowered = [term.lower() for term in terms]
+    sentences = [
+        sentence.strip()
+        for sentence in SENTENCE.findall(text)
+        if any(term in sentence.lower() for term in lowered)
+    ]
+    return " ".join(sentences) or text
+
+
+async def repair_keywords(
+    client: ClientBase,
+    original_text: str,
+    translated_text: str,
+    keywords: Keywords,
+    policy: RepairPolicy = RepairPolicy(),
+    limited: Callable[[Awaitable], Awaitable] = lambda coro: coro,
+    verbose: bool = False,
+) -> Tuple[Keywords, Dict]:
+    """
+    `match_keywords` that keeps whatever every answer got right. Only the first
+    request has every keyword, the next ones have the keywords still missing and
+    just the translated sentences they appear in.
+
+    Every request is cut at `policy.timeout` seconds. One that fails or matches
+    nothing is retried after an exponential backoff, uncached. A valid answer that
+    adds nothing once something matched ends the repair, the model skips the terms
+    it can't find. At most `policy.max_attempts` requests are made.
+
+    Failed requests never raise, even if every attempt failed: the report has the
+    last failure as `error` and callers decide whether no match is an error, see
+    `process.match_terms`. Anything but `MATCH_ERRORS` propagates right away.
+
+    Returns the matched keywords and a report with the attempts, the keywords left
+    missing, the last failure and the tokens used.
+    """
+    matched: Keywords = {}
+    found = set()
+    attempts = failures = 0
+    error: Optional[Exception] = None
+
+    with counting_tokens() as usage:
+        while attempts < policy.max_attempts:
+            missing = {k: v for k, v in keywords.items() if k not in found}
+            if not missing:
+                break
+
+            if failures:
+                await asyncio.sleep(policy.delay(failures))
+
+            # Repairs only need the sentences the missing keywords are in.
+            context = (
+                sentences_with(translated_text, list(missing))
+                if found
+                else translated_text
+            )
+            attempts += 1
+
+            try:
+                # The same prompt would get the same cached answer back.
+                with refreshing_cache() if failures else nullcontext():
+                    pairs = await limited(
+                        asyncio.wait_for(
+                            query_pairs(
+                                client,
+                                original_text,
+                                context,
+                                strip_cui(missing),
+                                verbose,
+                            ),
+                            policy.timeout,
+                        )
+                    )
+                new_keywords = resolve_pairs(original_text, pairs, missing)
+            except MATCH_ERRORS as e:
+                print(f"[WARNING] Matching attempt {attempts} failed: {e!r}")
+                error = e
+                failures += 1
+                continue
+
+            if not new_keywords:
+                if matched:
+                    break
+                failures += 1
+                continue
+
+            failures = 0
+            for original, cuis in new_keywords.items():
+                matched.setdefault(original, cuis)
+                found.update(k for k, v in missing.items() if v is cuis)
+
+    report = {
+        "attempts": attempts,
+        "missing": [k for k in keywords if k not in found],
+        "error": None if error is None else repr(error),
+        **usage.to_dict(),
+    }
+
+    return matched, report
@@ -0,0 +1,350 @@
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from rapidfuzz import fuzz, utils
+from .client import ClientBase
+from .translator import translate
+
+# Sentence ends followed by spaces, or line breaks. Kept when splitting, so the
+# translated report has the same layout.
+SENTENCE_BOUNDARY = re.compile(r"(\n+|(?<=[.!?;])[ \t]+)")
+NUMBER = re.compile(r"\d+(?:[.,]\d+)?")
+# Words that flip a finding. A near match must have the same ones, since a long
+# sentence can differ only by "sem"/"com" and still score above the threshold.
+NEGATION_CUES = {
+    "nao",
+    "não",
+    "sem",
+    "nem",
+    "nenhum",
+    "nenhuma",
+    "ausencia",
+    "ausência",
+    "ausente",
+    "ausentes",
+    "nega",
+    "negativo",
+    "negativa",
+    "inexistente",
+}
+LATERALITY_TERMS = {
+    "direita",
+    "direito",
+    "direitas",
+    "direitos",
+    "esquerda",
+    "esquerdo",
+    "esquerdas",
+    "esquerdos",
+    "bilateral",
+    "bilaterais",
+    "unilateral",
+    "ambos",
+    "ambas",
+}
+SEVERITY_TERMS = {
+    "leve",
+    "discreta",
+    "discreto",
+    "moderada",
+    "moderado",
+    "acentuada",
+    "acentuado",
+    "importante",
+    "grave",
+    "severa",
+    "severo",
+    "aumentada",
+    "aumentado",
+    "reduzida",
+    "reduzido",
+    "diminuida",
+    "diminuída",
+    "diminuido",
+    "diminuído",
+    "pequena",
+    "pequeno",
+    "grande",
+    "extensa",
+    "extenso",
+    "normal",
+}
+QUALIFIER_TERMS = NEGATION_CUES | LATERALITY_TERMS | SEVERITY_TERMS
+# Articles and prepositions, the only words a near match may differ by.
+FUNCTION_WORDS = {
+    "o",
+    "a",
+    "os",
+    "as",
+    "um",
+    "uma",
+    "uns",
+    "umas",
+    "de",
+    "do",
+    "da",
+    "dos",
+    "das",
+    "em",
+    "no",
+    "na",
+    "nos",
+    "nas",
+    "ao",
+    "aos",
+    "pelo",
+    "pela",
+    "pelos",
+    "pelas",
+}
+
+BATCH_SYS_PROMPT = """Your are a professional translator. You will receive a JSON object whose values are portuguese sentences from the same medical report and you should translate each of them to english. If there's a better translation in the medical context, that is, it's more common to use a certain phrase / term you can change the sentence as long as it means the same thing. Answer only with the same JSON object, same keys, with the english sentences as values."""
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Sentences at the even positions, the separators between them at the odd ones.
+    """
+    return SENTENCE_BOUNDARY.split(text)
+
+
+def normalize_sentence(sentence: str) -> str:
+    return utils.default_process(sentence)
+
+
+def fold_accents(text: str) -> str:
+    return "".join(
+        c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c)
+    )
+
+
+FOLDED_QUALIFIERS = {fold_accents(term) for term in QUALIFIER_TERMS}
+
+
+def content_words(normalized: str) -> Tuple[str, ...]:
+    """
+    The words of a normalized sentence, in order, without accents or function words.
+    """
+    return tuple(
+        word for word in fold_accents(normalized).split() if word not in FUNCTION_WORDS
+    )
+
+
+def same_qualifiers(a: str, b: str) -> bool:
+    """
+    Whether two normalized sentences have the same numbers and the same negation,
+    laterality and severity terms, in the same order.
+    """
+
+    def qualifiers(sentence: str) -> List[str]:
+        return [
+            word for word in fold_accents(sentence).split() if word in FOLDED_QUALIFIERS
+        ]
+
+    return NUMBER.findall(a) == NUMBER.findall(b) and qualifiers(a) == qualifiers(b)
+
+
+class TranslationMemory:
+    """
+    Remembers the translation of every report sentence, so stock sentences are only
+    ever sent to the LLM once.
+
+    A sentence matches when its normalized form (lowercase, no punctuation) is known.
+    Near matches only absorb normalization-level differences: a known sentence with
+    the same `content_words`, that is, differing only by spacing, accents, articles
+    or prepositions, with the same `same_qualifiers` and scoring at least
+    `near_threshold` with `fuzz.ratio` once accents and spacing are folded. A fuzzy
+    score alone would reuse "à esquerda" for "à direita" in a long sentence.
+
+    Stored in SQLite at `path`, evicting the least recently used sentences past
+    `max_entries`.
+    """
+
+    def __init__(
+        self,
+        path: Union[Path, str] = "translation_memory.sqlite3",
+        near_threshold: float = 95.0,
+        max_entries: int = 200_000,
+    ):
+        self.path = Path(path)
+        self.near_threshold = near_threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.sent_chars = 0
+        self.total_chars = 0
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sentences ("
+                "normalized TEXT PRIMARY KEY, translation TEXT NOT NULL, "
+                "used REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS sentences_used ON sentences (used)"
+            )
+            self._translations: Dict[str, str] = dict(
+                self._db.execute("SELECT normalized, translation FROM sentences")
+            )
+        self._index_keys()
+
+    def _index_keys(self):
+        self._by_content: Dict[Tuple[str, ...], List[str]] = {}
+        for normalized in self._translations:
+            self._by_content.setdefault(content_words(normalized), []).append(
+                normalized
+            )
+
+    def lookup(self, sentence: str) -> Optional[str]:
+        normalized = normalize_sentence(sentence)
+
+        with self._lock:
+            translation = self._translations.get(normalized)
+            if translation is not None:
+                self.hits += 1
+                self._touch(normalized)
+                return translation
+
+            # Scored without accents or repeated spaces, so the score only measures
+            # how much the articles and prepositions differ.
+            folded = " ".join(fold_accents(normalized).split())
+            candidates = [
+                (fuzz.ratio(folded, " ".join(fold_accents(known).split())), known)
+                for known in self._by_content.get(content_words(normalized), ())
+                if same_qualifiers(known, normalized)
+            ]
+            score, match = max(candidates, default=(0.0, None))
+            if match is not None and score >= self.near_threshold:
+                self.near_hits += 1
+                self._touch(match)
+                return self._translations[match]
+
+            self.misses += 1
+            return None
+
+    def store(self, pairs: List[Tuple[str, str]]):
+        now = time.time()
+        rows = [(normalize_sentence(s), t.strip(), now) for s, t in pairs]
+
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO sentences VALUES (?, ?, ?)", rows
+            )
+            for normalized, translation, _ in rows:
+                if normalized not in self._translations:
+                    self._by_content.setdefault(content_words(normalized), []).append(
+                        normalized
+                    )
+                self._translations[normalized] = translation
+
+            overflow = len(self._translations) - self.max_entries
+            if overflow > 0:
+                evicted = [
+                    key
+                    for (key,) in self._db.execute(
+                        "SELECT normalized FROM sentences ORDER BY used LIMIT ?",
+                        (overflow,),
+                    )
+                ]
+                self._db.executemany(
+                    "DELETE FROM sentences WHERE normalized = ?",
+                    [(key,) for key in evicted],
+                )
+                for key in evicted:
+                    del self._translations[key]
+                self._index_keys()
+
+    def _touch(self, normalized: str):
+        with self._db:
+            self._db.execute(
+                "UPDATE sentences SET used = ? WHERE normalized = ?",
+                (time.time(), normalized),
+            )
+
+    async def translate(self, client: ClientBase, text: str) -> str:
+        """
+        Same output as `translator.translate`, but only the sentences the memory
+        doesn't know are sent to the LLM, all of them in one request.
+        """
+        pieces = split_sentences(text)
+        sentences = [
+            i
+            for i in range(0, len(pieces), 2)
+            if normalize_sentence(pieces[i])  # Nothing to translate in "-" or "".
+        ]
+
+        unseen = []
+        for i in sentences:
+            translation = await asyncio.to_thread(self.lookup, pieces[i])
+            if translation is None:
+                unseen.append(i)
+            else:
+                pieces[i] = translation
+
+        self.total_chars += len(text)
+        if not unseen:
+            return "".join(pieces).strip()
+
+        originals = [pieces[i] for i in unseen]
+        translations = await self._translate_batch(client, originals)
+        if translations is None:
+            self.sent_chars += len(text)
+            return await translate(client, text)
+
+        self.sent_chars += sum(map(len, originals))
+        await asyncio.to_thread(self.store, list(zip(originals, translations)))
+        for i, translation in zip(unseen, translations):
+            pieces[i] = translation
+
+        return "".join(pieces).strip()
+
+    async def _translate_batch(
+        self, client: ClientBase, sentences: List[str]
+    ) -> Optional[List[str]]:
+        if len(sentences) == 1:
+            return [await translate(client, sentences[0])]
+
+        keys = [str(i) for i in range(len(sentences))]
+        answer = await client.async_query(
+            json.dumps(dict(zip(keys, sentences)), ensure_ascii=False),
+            BATCH_SYS_PROMPT,
+            format_obj={
+                "properties": {key: {"type": "string"} for key in keys},
+                "required": keys,
+            },
+        )
+
+        try:
+            translated = json.loads(answer)
+            return [translated[key].strip() for key in keys]
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+            print(
+                "[WARNING] Batched translation came back malformed, translating whole."
+            )
+            return None
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            "sentences": len(self._translations),
+            "sent_chars": self.sent_chars,
+            "total_chars": self.total_chars,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
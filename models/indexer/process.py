@@ -1,10 +1,64 @@
-from .translator import translate
-from .client import ClientBase
-from .matcher import match_keywords
+import asyncio
+from .translator import translate, stream_translation
+from .client import ClientBase, TokenUsage
+from .matcher import RepairPolicy, repair_keywords
 from .ctakes import index_texts
-from .soap import generate_soap
+from .batching import CTakesBatcher
+from .memory import TranslationMemory
+from .annotator import ConceptAnnotator
+from .soap import generate_soap, stream_soap, normalize_soap_text
 from .common import Keywords, keywords_to_beauty, removed_duplicates
-from typing import List, Union
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+T = TypeVar("T")
+
+
+async def match_terms(
+    client: ClientBase,
+    text: str,
+    translation: str,
+    keywords: Keywords,
+    do_it_right: bool = True,
+    limited: Callable[[Awaitable[T]], Awaitable[T]] = lambda coro: coro,
+    repair: Optional[RepairPolicy] = None,
+) -> Tuple[Dict, Dict]:
+    """
+    The matched terms and the matching report, see `matcher.repair_keywords`.
+    With `do_it_right` nothing matched is a ValueError, whether the answers were
+    unusable or every request failed. Without it a single request is made and a
+    bad answer or a failed request gives no terms.
+    """
+    # Nothing for the LLM to correlate, retrying would only burn requests.
+    if not keywords:
+        return keywords_to_beauty(keywords), {
+            "attempts": 0,
+            "missing": [],
+            "error": None,
+            **TokenUsage().to_dict(),
+        }
+
+    repair = repair or RepairPolicy()
+    if not do_it_right:
+        repair = repair._replace(max_attempts=1)
+
+    matched_keywords, report = await repair_keywords(
+        client, text, translation, keywords, repair, limited
+    )
+
+    if not matched_keywords and do_it_right:
+        raise ValueError(f"The snomed was fucked! Last failure: {report['error']}")
+
+    return keywords_to_beauty(matched_keywords), report
 
 
 async def process_texts(
@@ -14,40 +68,137 @@ async def process_texts(
     ctakes_path="apache-ctakes-6.0.0-bin",
     use_soap: bool = False,
     do_it_right: bool = True,
+    ctakes: Optional[CTakesBatcher] = None,
+    max_concurrency: int = 8,
+    memory: Optional[TranslationMemory] = None,
+    annotator: Optional[ConceptAnnotator] = None,
+    repair: Optional[RepairPolicy] = None,
 ):
+    """
+    Every text goes through SOAP, translation and matching independently, with at
+    most `max_concurrency` LLM requests in flight. Results keep the input order.
+
+    When `ctakes` is given, the texts are indexed in a batch shared with every other
+    concurrent caller instead of a cTAKES run of their own, and each text moves on to
+    matching as soon as its batch is done. With `memory`, only the sentences it
+    doesn't know yet are translated by the LLM. With `annotator`, concepts are
+    looked up in-process and cTAKES isn't used at all. `matching` has the report of
+    every text's term matching, see `matcher.repair_keywords`.
+    """
     if isinstance(texts, str):
         texts = [texts]
 
+    limit = asyncio.Semaphore(max_concurrency)
+
+    async def limited(coro: Awaitable[T]) -> T:
+        async with limit:
+            return await coro
+
+    async def prepare(text: str) -> Tuple[str, str]:
+        if use_soap:
+            text = await limited(generate_soap(client, text))
+        if memory is not None:
+            return text, await limited(memory.translate(client, text))
+        return text, await limited(translate(client, text))
+
+    async def match(
+        text: str, translation: str, keywords: Keywords
+    ) -> Tuple[Dict, Dict]:
+        return await match_terms(
+            client, text, translation, keywords, do_it_right, limited, repair
+        )
+
+    if annotator is not None or ctakes is not None:
+
+        async def pipeline(text: str) -> Tuple[str, Tuple[Dict, Dict]]:
+            text, translation = await prepare(text)
+            if annotator is not None:
+                keywords = await asyncio.to_thread(annotator.annotate, translation)
+            else:
+                keywords = await ctakes.index(translation)
+            return text, await match(text, translation, keywords)
+
+        results = await asyncio.gather(*[pipeline(text) for text in texts])
+        texts = [text for text, _ in results]
+        acc = [matched for _, matched in results]
+    else:
+        prepared = await asyncio.gather(*[prepare(text) for text in texts])
+        texts = [text for text, _ in prepared]
+        translations = [translation for _, translation in prepared]
+
+        indexed = await index_texts(translations, ctakes_path, ulms_api_key)
+        acc = await asyncio.gather(
+            *[
+                match(texts[i], translations[i], indexed.get(i, {}))
+                for i in range(len(texts))
+            ]
+        )
+
+    return {
+        "texts": texts,
+        "medicalTerms": [terms for terms, _ in acc],
+        "matching": [report for _, report in acc],
+    }
+
+
+async def stream_process_text(
+    client: ClientBase,
+    text: str,
+    ulms_api_key: str,
+    ctakes_path="apache-ctakes-6.0.0-bin",
+    use_soap: bool = False,
+    do_it_right: bool = True,
+    ctakes: Optional[CTakesBatcher] = None,
+    memory: Optional[TranslationMemory] = None,
+    annotator: Optional[ConceptAnnotator] = None,
+    repair: Optional[RepairPolicy] = None,
+) -> AsyncIterator[Dict]:
+    """
+    Same pipeline as `process_texts` for a single text, reported as it goes:
+
+    - `{"event": "delta", "stage": "soap" | "translation", "text": ...}` per token.
+      Translations made with `memory` aren't streamed, they mostly come from it.
+    - `{"event": "stage", "stage": "soap" | "translation", "text": ...}` when a
+      stage is done, with its final text.
+    - `{"event": "stage", "stage": "medicalTerms", "medicalTerms": ...}`.
+    - `{"event": "done", "text": ..., "medicalTerms": ..., "matching": ...}`, the
+      same content `/index` answers with.
+    """
     if use_soap:
-        texts = [await generate_soap(client, text) for text in texts]
-
-    translations = [await translate(client, text) for text in texts]
-    acc = []
-    for index, keywords in (
-        await index_texts(translations, ctakes_path, ulms_api_key)
-    ).items():
-        if do_it_right:
-            i = 0
-
-            while True:
-                if i > 3:
-                    raise ValueError("The snomed was fucked!")
-
-                matched_keywords = await match_keywords(
-                    client, texts[index], translations[index], keywords
-                )
-
-                if not matched_keywords:
-                    i += 1
-                    continue
-
-                acc.append(keywords_to_beauty(matched_keywords))
-                break
-        else:
-            matched_keywords = await match_keywords(
-                client, texts[index], translations[index], keywords
-            )
-
-            acc.append(keywords_to_beauty(matched_keywords))
-
-    return {"texts": texts, "medicalTerms": acc}
+        tokens = []
+        async for token in stream_soap(client, text):
+            tokens.append(token)
+            yield {"event": "delta", "stage": "soap", "text": token}
+
+        text = normalize_soap_text("".join(tokens))
+        yield {"event": "stage", "stage": "soap", "text": text}
+
+    if memory is not None:
+        translation = await memory.translate(client, text)
+    else:
+        tokens = []
+        async for token in stream_translation(client, text):
+            tokens.append(token)
+            yield {"event": "delta", "stage": "translation", "text": token}
+
+        translation = "".join(tokens).strip()
+    yield {"event": "stage", "stage": "translation", "text": translation}
+
+    if annotator is not None:
+        keywords = await asyncio.to_thread(annotator.annotate, translation)
+    elif ctakes is not None:
+        keywords = await ctakes.index(translation)
+    else:
+        indexed = await index_texts([translation], ctakes_path, ulms_api_key)
+        keywords = indexed.get(0, {})
+
+    medical_terms, report = await match_terms(
+        client, text, translation, keywords, do_it_right, repair=repair
+    )
+    yield {"event": "stage", "stage": "medicalTerms", "medicalTerms": medical_terms}
+    yield {
+        "event": "done",
+        "text": text,
+        "medicalTerms": medical_terms,
+        "matching": report,
+    }
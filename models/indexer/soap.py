@@ -1,13 +1,13 @@
 import re
+from typing import AsyncIterator
 from .client import ClientBase
 
 
-async def generate_soap(client: ClientBase, texto: str) -> str:
+def soap_prompt(texto: str) -> str:
     """
-    Gera uma nota SOAP a partir de um texto clínico em português.
     O prompt é em inglês (para melhor compreensão), mas a saída é em português.
     """
-    prompt = f"""
+    return f"""
 You are a clinical assistant that generates SOAP notes in a fixed format.
 
 Tasks:
@@ -44,10 +44,23 @@ Input text (in Portuguese):
 {texto}
 """
 
-    soap_text = await client.async_query(prompt, "", False)
+
+async def generate_soap(client: ClientBase, texto: str) -> str:
+    """
+    Gera uma nota SOAP a partir de um texto clínico em português.
+    """
+    soap_text = await client.async_query(soap_prompt(texto), "", False)
     return normalize_soap_text(soap_text)
 
 
+async def stream_soap(client: ClientBase, texto: str) -> AsyncIterator[str]:
+    """
+    Mesma nota de `generate_soap`, em pedaços conforme é gerada e sem normalizar.
+    """
+    async for token in client.async_stream(soap_prompt(texto), "", False):
+        yield token
+
+
 def normalize_soap_text(soap_text: str) -> str:
     """
     Limpa e normaliza o texto SOAP, garantindo espaçamento e títulos corretos.
@@ -1,3 +1,19 @@
 from .boot import announce_start
+from .aio import AsyncStreamer
+from .config import EngineConfig, load_engine_configs, ENGINE_NAMES
+from .threads import limit_torch_threads, limit_tf_threads
+from .streamer import create_streamer
+from .cache import ResultCache, digest_bytes
 
-__all__ = ["announce_start"]
+__all__ = [
+    "announce_start",
+    "AsyncStreamer",
+    "EngineConfig",
+    "load_engine_configs",
+    "ENGINE_NAMES",
+    "limit_torch_threads",
+    "limit_tf_threads",
+    "create_streamer",
+    "ResultCache",
+    "digest_bytes",
+]
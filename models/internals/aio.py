@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from typing import Any, Callable, List
+from service_streamer.service_streamer import Future, WORKER_TIMEOUT, _FutureCache
+
+
+class _HookedFutureCache(_FutureCache):
+    """
+    Future cache that instruments every future as soon as the streamer registers it,
+    that is, before any request reaches the workers. This way no result can arrive
+    before the completion hook is in place.
+    """
+
+    def __setitem__(self, task_id: int, future: Future):
+        _install_done_hook(future)
+        super().__setitem__(task_id, future)
+
+    def __delitem__(self, task_id: int):
+        # `Future.result` deletes its entry, which `AsyncStreamer` may have dropped.
+        self.pop(task_id, None)
+
+    def __missing__(self, task_id: int):
+        # Outputs of an abandoned task still arrive, they're discarded.
+        return _DISCARDED
+
+
+class _DiscardedFuture:
+    def _append_result(self, it_id, it_output):
+        pass
+
+
+_DISCARDED = _DiscardedFuture()
+
+
+def _install_done_hook(future: Future):
+    future._done_lock = threading.Lock()
+    future._done_callbacks = []
+    future._done_fired = False
+
+    append_result = future._append_result
+
+    def hooked_append_result(it_id, it_output):
+        append_result(it_id, it_output)
+        if not future.done():
+            return
+
+        with future._done_lock:
+            if future._done_fired:
+                return
+            future._done_fired = True
+            callbacks = future._done_callbacks
+            future._done_callbacks = []
+
+        for callback in callbacks:
+            callback()
+
+    future._append_result = hooked_append_result
+
+
+def _add_done_callback(future: Future, callback: Callable[[], Any]):
+    with future._done_lock:
+        if not future._done_fired:
+            future._done_callbacks.append(callback)
+            return
+
+    callback()
+
+
+class AsyncStreamer:
+    """
+    Asyncio front-end for a `service_streamer` streamer.
+
+    `submit` returns an awaitable future that is resolved by the streamer's
+    result-collecting thread, so `async def` handlers can wait on predictions
+    without holding a threadpool thread each.
+    """
+
+    def __init__(self, streamer, timeout: float = WORKER_TIMEOUT):
+        self.streamer = streamer
+        self.timeout = timeout
+
+        hooked_cache = _HookedFutureCache()
+        hooked_cache.update(streamer._future_cache)
+        streamer._future_cache = hooked_cache
+
+    def submit(self, batch: List) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        aio_future = loop.create_future()
+
+        if len(batch) == 0:
+            aio_future.set_result([])
+            return aio_future
+
+        future = self.streamer.submit(batch)
+
+        def resolve(outputs: List):
+            if not aio_future.done():
+                aio_future.set_result(outputs)
+
+        def notify():
+            # `result` is what removes the future from the streamer's cache, so it's
+            # collected here even if nobody waits for it anymore.
+            outputs = future.result(0)
+            try:
+                loop.call_soon_threadsafe(resolve, outputs)
+            except RuntimeError:
+                # The loop was closed while the batch was running, nobody is waiting.
+                pass
+
+        def abandon(aio_future: asyncio.Future):
+            # Timed out or the client went away, the outputs won't be read.
+            if aio_future.cancelled():
+                self.streamer._future_cache.pop(future._id, None)
+
+        aio_future.add_done_callback(abandon)
+        _add_done_callback(future, notify)
+        return aio_future
+
+    async def predict(self, batch: List) -> List:
+        return await asyncio.wait_for(self.submit(batch), self.timeout)
@@ -0,0 +1,124 @@
+"""
+Compares the fixed `service_streamer` batching with the adaptive policy on
+synthetic request arrival traces. The model is simulated (discrete events), so
+the benchmark runs in seconds and doesn't need any weights.
+
+Run with: python -m models.internals.bench_scheduler
+"""
+
+import numpy as np
+from typing import Callable, Dict, List
+from .scheduler import FixedBatchPolicy, AdaptiveBatchPolicy
+
+
+def poisson_trace(rate: float, duration: float, rng: np.random.Generator) -> np.ndarray:
+    intervals = rng.exponential(1 / rate, size=int(rate * duration * 2) + 10)
+    arrivals = np.cumsum(intervals)
+    return arrivals[arrivals < duration]
+
+
+def bursty_trace(
+    low: float, high: float, period: float, duration: float, rng: np.random.Generator
+) -> np.ndarray:
+    arrivals = []
+    start = 0.0
+    while start < duration:
+        rate = high if int(start / period) % 2 else low
+        arrivals.extend(start + poisson_trace(rate, period, rng))
+        start += period
+
+    return np.array([t for t in arrivals if t < duration])
+
+
+def linear_cost(fixed: float, per_item: float) -> Callable[[int], float]:
+    return lambda batch_size: fixed + per_item * batch_size
+
+
+def simulate(
+    policy: FixedBatchPolicy, arrivals: np.ndarray, cost: Callable[[int], float]
+) -> Dict[str, float]:
+    """
+    Replays `arrivals` against a single worker that batches like `AdaptiveStreamWorker`.
+    """
+    latencies: List[float] = []
+    batch_sizes: List[int] = []
+
+    next_arrival = 0
+    queue: List[float] = []
+    now = 0.0
+
+    while next_arrival < len(arrivals) or queue:
+        if not queue:
+            now = max(now, arrivals[next_arrival])
+
+        while next_arrival < len(arrivals) and arrivals[next_arrival] <= now:
+            queue.append(arrivals[next_arrival])
+            policy.observe_arrival(arrivals[next_arrival])
+            next_arrival += 1
+
+        batch_size, wait = policy.plan(len(queue), now - queue[0])
+        deadline = now + wait
+
+        while len(queue) < batch_size and next_arrival < len(arrivals):
+            if arrivals[next_arrival] > deadline:
+                break
+            now = max(now, arrivals[next_arrival])
+            queue.append(arrivals[next_arrival])
+            policy.observe_arrival(arrivals[next_arrival])
+            next_arrival += 1
+
+        if len(queue) < batch_size:
+            now = max(now, deadline) if next_arrival < len(arrivals) else now
+
+        batch, queue = queue[:batch_size], queue[batch_size:]
+        inference_time = cost(len(batch))
+        now += inference_time
+
+        batch_latencies = [now - arrival for arrival in batch]
+        latencies.extend(batch_latencies)
+        batch_sizes.append(len(batch))
+        policy.record(len(batch), inference_time, batch_latencies)
+
+    return {
+        "p50": float(np.percentile(latencies, 50)),
+        "p99": float(np.percentile(latencies, 99)),
+        "mean_batch": float(np.mean(batch_sizes)),
+        "throughput": len(latencies) / now,
+    }
+
+
+def main():
+    rng = np.random.default_rng(0)
+    duration = 120.0
+    # Roughly a 224x224 CNN on CPU: 30ms dispatch plus 8ms per image.
+    cost = linear_cost(0.03, 0.008)
+
+    traces = {
+        "low (2 rps)": poisson_trace(2, duration, rng),
+        "medium (20 rps)": poisson_trace(20, duration, rng),
+        "high (60 rps)": poisson_trace(60, duration, rng),
+        "bursty (2/60 rps)": bursty_trace(2, 60, 10, duration, rng),
+    }
+
+    policies = {
+        "fixed b=2 w=100ms": lambda: FixedBatchPolicy(2, 0.1),
+        "fixed b=16 w=100ms": lambda: FixedBatchPolicy(16, 0.1),
+        "adaptive p99<=300ms": lambda: AdaptiveBatchPolicy(16, 0.1, 0.3),
+    }
+
+    print(
+        f"{'trace':<20}{'policy':<22}{'p50 (ms)':>10}{'p99 (ms)':>10}"
+        f"{'batch':>8}{'req/s':>8}"
+    )
+    for trace_name, arrivals in traces.items():
+        for policy_name, create_policy in policies.items():
+            stats = simulate(create_policy(), arrivals, cost)
+            print(
+                f"{trace_name:<20}{policy_name:<22}"
+                f"{stats['p50'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}"
+                f"{stats['mean_batch']:>8.2f}{stats['throughput']:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
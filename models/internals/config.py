@@ -0,0 +1,90 @@
+from typing import Dict, NamedTuple, Optional, Tuple
+
+ENGINE_NAMES = ("modality", "region", "diseases", "ecg", "fracture")
+SCHEDULERS = ("fixed", "adaptive")
+INFERENCE_MODES = ("predict", "function")
+BACKENDS = ("keras", "onnx", "tflite")
+TORCH_BACKENDS = ("eager", "compile", "torchscript", "onnx")
+
+
+class EngineConfig(NamedTuple):
+    batch_size: int = 2
+    max_latency: float = 0.1
+    worker_num: int = 1
+    # None runs on CPU, otherwise the workers are spread over these devices.
+    cuda_devices: Optional[Tuple[int, ...]] = None
+    # None keeps the framework default (usually one thread per core).
+    intra_op_threads: Optional[int] = None
+    # "adaptive" treats batch_size and max_latency as upper bounds and tunes
+    # both at runtime to keep the p99 latency under latency_target (seconds).
+    scheduler: str = "fixed"
+    latency_target: float = 0.5
+    # TensorFlow engines only. "function" calls a traced tf.function per batch size
+    # instead of Keras `predict`, optionally compiled with XLA (jit_compile).
+    inference: str = "predict"
+    jit_compile: bool = False
+    # Batch sizes run once at load time. None warms up every size up to batch_size
+    # with "function", or the "compile"/"torchscript" ECG backends, and none otherwise.
+    warmup_batch_sizes: Optional[Tuple[int, ...]] = None
+    # TensorFlow engines only. "onnx" and "tflite" run the networks exported by
+    # `python -m models.radio.export` instead of the Keras weights.
+    backend: str = "keras"
+    # The quantized export for "onnx"/"tflite".
+    int8: bool = False
+    # ECG engine only, see `ECG_BACKENDS` in models/ecg/model_api.py. torch_int8
+    # quantizes its Linear layers, or picks the quantized ONNX export.
+    torch_backend: str = "eager"
+    torch_int8: bool = False
+
+    def warmup_sizes(self) -> Tuple[int, ...]:
+        if self.warmup_batch_sizes is not None:
+            return self.warmup_batch_sizes
+        if self.inference == "function":
+            return tuple(range(1, self.batch_size + 1))
+        return ()
+
+
+def parse_engine_config(raw: Optional[Dict], base: EngineConfig = EngineConfig()):
+    """
+    Builds an EngineConfig from a (possibly partial) dictionary, using `base`
+    for every missing key.
+    """
+    if not raw:
+        return base
+
+    unknown = set(raw.keys()) - set(EngineConfig._fields)
+    if unknown:
+        raise ValueError(f"Unknown engine settings: {', '.join(sorted(unknown))}")
+
+    config = base._replace(**raw)
+    if config.scheduler not in SCHEDULERS:
+        raise ValueError(f"Unknown scheduler: {config.scheduler}")
+    if config.inference not in INFERENCE_MODES:
+        raise ValueError(f"Unknown inference mode: {config.inference}")
+    if config.backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {config.backend}")
+    if config.torch_backend not in TORCH_BACKENDS:
+        raise ValueError(f"Unknown torch backend: {config.torch_backend}")
+    if config.cuda_devices is not None:
+        config = config._replace(cuda_devices=tuple(config.cuda_devices))
+    if config.warmup_batch_sizes is not None:
+        config = config._replace(warmup_batch_sizes=tuple(config.warmup_batch_sizes))
+
+    return config
+
+
+def load_engine_configs(raw: Optional[Dict]) -> Dict[str, EngineConfig]:
+    """
+    Loads the settings of every engine from the `engines` section of the environment.
+
+    The optional `default` entry applies to every engine, and each engine entry
+    only needs to override what differs from it.
+    """
+    raw = raw or {}
+
+    unknown = set(raw.keys()) - set(ENGINE_NAMES) - {"default"}
+    if unknown:
+        raise ValueError(f"Unknown engines: {', '.join(sorted(unknown))}")
+
+    default = parse_engine_config(raw.get("default"))
+    return {name: parse_engine_config(raw.get(name), default) for name in ENGINE_NAMES}
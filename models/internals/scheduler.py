@@ -0,0 +1,240 @@
+import time
+import numpy as np
+from collections import deque
+from typing import List, Optional, Tuple
+from service_streamer.service_streamer import (
+    Streamer,
+    StreamWorker,
+    _BaseStreamer,
+    mp,
+    TIMEOUT,
+)
+
+
+class FixedBatchPolicy:
+    """
+    Same behaviour as `service_streamer`: always aims for `batch_size` items and
+    waits up to `max_latency` for them.
+    """
+
+    def __init__(self, batch_size: int, max_latency: float):
+        self.max_batch_size = batch_size
+        self.max_latency = max_latency
+
+    def observe_arrival(self, enqueued_at: float): ...
+
+    def plan(self, queue_depth: int, oldest_age: float) -> Tuple[int, float]:
+        return self.max_batch_size, self.max_latency
+
+    def record(self, batch_size: int, inference_time: float, latencies: List[float]): ...
+
+
+class AdaptiveBatchPolicy(FixedBatchPolicy):
+    """
+    Picks the batch size and the wait window of every batch from the queue depth,
+    the request arrival rate and a linear model of the per-batch inference time,
+    aiming at keeping the `percentile` latency under `latency_target`.
+
+    `batch_size` and `max_latency` become upper bounds instead of fixed values.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        max_latency: float,
+        latency_target: float,
+        percentile: float = 99,
+        history: int = 512,
+    ):
+        super().__init__(batch_size, max_latency)
+        self.latency_target = latency_target
+        self.percentile = percentile
+
+        # Shrinks the wait window when the target is missed and grows it back slowly.
+        self.wait_scale = 1.0
+        self.latencies = deque(maxlen=history)
+        self.costs = deque(maxlen=64)
+
+        self.arrival_interval: Optional[float] = None
+        self.last_arrival: Optional[float] = None
+
+    def observe_arrival(self, enqueued_at: float):
+        if self.last_arrival is not None:
+            interval = max(enqueued_at - self.last_arrival, 0.0)
+            if self.arrival_interval is None:
+                self.arrival_interval = interval
+            else:
+                self.arrival_interval = 0.9 * self.arrival_interval + 0.1 * interval
+
+        self.last_arrival = enqueued_at
+
+    def estimate_cost(self, batch_size: int) -> float:
+        if not self.costs:
+            return 0.0
+
+        sizes, times = zip(*self.costs)
+        if len(set(sizes)) < 2:
+            # Not enough information for a slope, assume the cost grows linearly.
+            return float(np.mean(times) / np.mean(sizes) * batch_size)
+
+        slope, intercept = np.polyfit(sizes, times, 1)
+        return float(max(intercept, 0.0) + max(slope, 0.0) * batch_size)
+
+    def target_batch_size(self) -> int:
+        # Half of the budget is left for the time spent queued.
+        budget = self.latency_target / 2
+        batch_size = 1
+        while (
+            batch_size < self.max_batch_size
+            and self.estimate_cost(batch_size + 1) <= budget
+        ):
+            batch_size += 1
+
+        return batch_size
+
+    def sustainable_batch_size(self, headroom: float = 1.2) -> int:
+        """
+        Smallest batch that keeps up with the current arrival rate, waiting for
+        anything bigger only adds latency.
+        """
+        if self.arrival_interval is None or self.arrival_interval == 0:
+            return self.max_batch_size
+
+        arrival_rate = headroom / self.arrival_interval
+        for batch_size in range(1, self.max_batch_size + 1):
+            cost = self.estimate_cost(batch_size)
+            if cost == 0 or batch_size / cost >= arrival_rate:
+                return batch_size
+
+        return self.max_batch_size
+
+    def plan(self, queue_depth: int, oldest_age: float) -> Tuple[int, float]:
+        wanted = self.sustainable_batch_size()
+        batch_size = self.target_batch_size()
+        if queue_depth >= wanted:
+            # Everything that is already queued goes, up to the latency bound.
+            return min(max(queue_depth, wanted), batch_size), 0.0
+
+        batch_size = min(wanted, batch_size)
+
+        # Waiting only pays off if another request is expected within the window.
+        if self.arrival_interval is None:
+            return batch_size, 0.0
+
+        slack = self.latency_target - oldest_age - self.estimate_cost(batch_size)
+        fill_time = (batch_size - queue_depth) * self.arrival_interval
+        wait = min(self.max_latency, max(slack, 0.0) * self.wait_scale, fill_time)
+
+        if self.arrival_interval > wait:
+            wait = 0.0
+
+        return batch_size, wait
+
+    def record(self, batch_size: int, inference_time: float, latencies: List[float]):
+        self.costs.append((batch_size, inference_time))
+        self.latencies.extend(latencies)
+
+        observed = np.percentile(self.latencies, self.percentile)
+        if observed > self.latency_target:
+            self.wait_scale = max(self.wait_scale * 0.5, 0.05)
+        elif observed < 0.8 * self.latency_target:
+            self.wait_scale = min(self.wait_scale + 0.05, 1.0)
+
+
+class AdaptiveStreamWorker(StreamWorker):
+    """
+    Stream worker whose batches are shaped by a batch policy. Requests carry their
+    enqueue timestamp in the (otherwise unused) client id slot.
+    """
+
+    def __init__(self, *args, policy: FixedBatchPolicy, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._policy = policy
+
+    def _queue_depth(self) -> int:
+        try:
+            return self._request_queue.qsize()
+        except NotImplementedError:
+            # macOS doesn't implement qsize, the policy then only sees the current batch.
+            return 0
+
+    def _recv_batch(self) -> List:
+        try:
+            batch = [self._recv_request(timeout=TIMEOUT)]
+        except TimeoutError:
+            return []
+
+        self._policy.observe_arrival(batch[0][0])
+        batch_size, wait = self._policy.plan(
+            self._queue_depth() + 1, time.time() - batch[0][0]
+        )
+        deadline = time.time() + wait
+
+        while len(batch) < batch_size:
+            try:
+                item = self._recv_request(timeout=max(deadline - time.time(), 0.0))
+            except TimeoutError:
+                break
+
+            self._policy.observe_arrival(item[0])
+            batch.append(item)
+
+        return batch
+
+    def _run_once(self):
+        batch = self._recv_batch()
+        if not batch:
+            return 0
+
+        start_time = time.time()
+        model_outputs = self.model_predict([item[3] for item in batch])
+        end_time = time.time()
+
+        for i, (_, task_id, request_id, _) in enumerate(batch):
+            self._send_response(None, task_id, request_id, model_outputs[i])
+
+        self._policy.record(
+            len(batch), end_time - start_time, [end_time - item[0] for item in batch]
+        )
+
+        return len(batch)
+
+
+class AdaptiveStreamer(Streamer):
+    """
+    `Streamer` whose workers batch requests according to `policy`.
+    Same interface as `Streamer`, so it works with `AsyncStreamer` as well.
+    """
+
+    def __init__(
+        self,
+        predict_function_or_model,
+        policy: FixedBatchPolicy,
+        worker_num: int = 1,
+        cuda_devices=None,
+        model_init_args=None,
+        model_init_kwargs=None,
+    ):
+        _BaseStreamer.__init__(self)
+        self.worker_num = worker_num
+        self.cuda_devices = cuda_devices
+        self._input_queue = mp.Queue()
+        self._output_queue = mp.Queue()
+        self._worker = AdaptiveStreamWorker(
+            predict_function_or_model,
+            policy.max_batch_size,
+            policy.max_latency,
+            self._input_queue,
+            self._output_queue,
+            model_init_args,
+            model_init_kwargs,
+            policy=policy,
+        )
+        self._worker_ps = []
+        self._worker_ready_events = []
+        self._worker_destroy_events = []
+        self._setup_gpu_worker()
+        self._delay_setup()
+
+    def _send_request(self, task_id, request_id, model_input):
+        self._input_queue.put((time.time(), task_id, request_id, model_input))
@@ -0,0 +1,34 @@
+from service_streamer import ManagedModel, Streamer
+from typing import Type
+from .config import EngineConfig
+from .scheduler import AdaptiveStreamer, AdaptiveBatchPolicy
+
+
+def create_streamer(
+    model_class: Type[ManagedModel], config: EngineConfig, **init_kwargs
+):
+    """
+    `init_kwargs` go to the model's `init_model` along with `intra_op_threads`.
+    """
+    model_init_kwargs = {"intra_op_threads": config.intra_op_threads, **init_kwargs}
+
+    if config.scheduler == "adaptive":
+        policy = AdaptiveBatchPolicy(
+            config.batch_size, config.max_latency, config.latency_target
+        )
+        return AdaptiveStreamer(
+            model_class,
+            policy,
+            config.worker_num,
+            config.cuda_devices,
+            model_init_kwargs=model_init_kwargs,
+        )
+
+    return Streamer(
+        model_class,
+        config.batch_size,
+        config.max_latency,
+        config.worker_num,
+        config.cuda_devices,
+        model_init_kwargs=model_init_kwargs,
+    )
@@ -0,0 +1,20 @@
+from typing import Optional
+
+
+def limit_torch_threads(intra_op_threads: Optional[int]):
+    if intra_op_threads is None:
+        return
+
+    import torch
+
+    torch.set_num_threads(intra_op_threads)
+
+
+def limit_tf_threads(intra_op_threads: Optional[int]):
+    # Has to run before TensorFlow initializes its runtime, that is, before loading any model.
+    if intra_op_threads is None:
+        return
+
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
@@ -1,3 +1,11 @@
 from .managed_models import create_modality, create_diseases, create_region
+from .model import prepare_for_models, DEFAULT_INPUT_SIZE, MODALITY_INPUT_SIZE
 
-__all__ = ["create_modality", "create_diseases", "create_region"]
+__all__ = [
+    "create_modality",
+    "create_diseases",
+    "create_region",
+    "prepare_for_models",
+    "DEFAULT_INPUT_SIZE",
+    "MODALITY_INPUT_SIZE",
+]
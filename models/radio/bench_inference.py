@@ -0,0 +1,114 @@
+"""
+Compares Keras `model.predict` with the traced `tf.function` path of
+`ConvolutionalModel`, with and without XLA, on the small batches the engines
+usually run. Every mode is warmed up first, so only steady-state calls are timed.
+
+Run with: python -m models.radio.bench_inference [modality|region|diseases|pneumonia|synthetic]
+
+The radiography weights aren't public, `synthetic` (the default) times a small
+stand-in CNN instead.
+"""
+
+import io
+import sys
+import tempfile
+import time
+import numpy as np
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Callable, Dict
+from .model import (
+    DEFAULT_INPUT_SIZE,
+    ConvolutionalModel,
+    load_modality_model,
+    load_multiple_diseases_model,
+    load_pneumonia_model,
+    load_region_model,
+)
+
+BATCH_SIZES = (1, 2, 4, 8)
+REPEAT = 30
+
+
+def load_synthetic_model(workdir: str) -> ConvolutionalModel:
+    from keras._tf_keras.keras import Input, Sequential, layers
+
+    model = Sequential(
+        [
+            Input((*DEFAULT_INPUT_SIZE, 3)),
+            layers.Conv2D(16, 3, strides=2, activation="relu"),
+            layers.Conv2D(32, 3, strides=2, activation="relu"),
+            layers.Conv2D(64, 3, strides=2, activation="relu"),
+            layers.GlobalAveragePooling2D(),
+            layers.Dense(14),
+        ]
+    )
+    path = Path(workdir).joinpath("synthetic.keras")
+    model.save(path)
+
+    return ConvolutionalModel(path, {i: f"class {i}" for i in range(14)})
+
+
+LOADERS: Dict[str, Callable[[], ConvolutionalModel]] = {
+    "modality": load_modality_model,
+    "region": load_region_model,
+    "diseases": load_multiple_diseases_model,
+    "pneumonia": load_pneumonia_model,
+}
+
+
+def set_mode(model: ConvolutionalModel, mode: str):
+    if mode == "predict":
+        model.forward = None
+    else:
+        model.use_function(jit_compile=mode == "function+xla")
+
+
+def time_mode(model: ConvolutionalModel, batch) -> float:
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        model.predict_by_list(batch)
+    return (time.perf_counter() - start) / REPEAT
+
+
+def main():
+    name = sys.argv[1] if len(sys.argv) > 1 else "synthetic"
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        model = (
+            load_synthetic_model(workdir) if name == "synthetic" else LOADERS[name]()
+        )
+
+        print(f"{'mode':<14}{'batch':>6}{'ms':>10}{'speedup':>9}{'max diff':>10}")
+        for batch_size in BATCH_SIZES:
+            batch = [
+                rng.uniform(0, 255, (*model.input_size, 3)).astype(np.float32)
+                for _ in range(batch_size)
+            ]
+            baseline, reference = None, None
+
+            for mode in ("predict", "function", "function+xla"):
+                try:
+                    # `predict` still draws its progress bar, just not over the table.
+                    with redirect_stdout(io.StringIO()):
+                        set_mode(model, mode)
+                        model.warmup([batch_size])
+                        output = model.predict_by_list(batch)
+                        elapsed = time_mode(model, batch)
+                except Exception as e:
+                    # XLA isn't available on every build and device.
+                    print(f"{mode:<14}{batch_size:>6}  failed: {e!r}")
+                    continue
+
+                if baseline is None:
+                    baseline, reference = elapsed, output
+                print(
+                    f"{mode:<14}{batch_size:>6}{elapsed * 1000:>10.2f}"
+                    f"{baseline / elapsed:>8.1f}x"
+                    f"{np.abs(output - reference).max():>10.2e}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Exports the radiography networks from `models/radio/weights` to ONNX and/or
+TFLite, next to the Keras weights (see `runtimes.exported_path`), and checks that
+the exported versions give the same labels.
+
+    python -m models.radio.export [--format onnx tflite] [--int8 --calibration DIR]
+        [--check DIR] [modality region diseases pneumonia]
+
+`--int8` adds a post-training quantized version, calibrated on the images in the
+`--calibration` folder, preprocessed exactly like the app does. `--check` runs the
+Keras model and every exported version on the images of a folder and reports how
+often their labels agree (`match_labels`, or `match_labels_thresholded` for
+pneumonia, like the diseases engine).
+
+Exporting needs TensorFlow plus `tf2onnx` and `onnxruntime` for ONNX. Serving the
+exports only needs `onnxruntime` or `tflite-runtime`.
+"""
+
+import argparse
+import cv2
+import numpy as np
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+from .model import (
+    RADIO_MODELS,
+    ConvolutionalModel,
+    load_radio_model,
+    prepare_image,
+    preprocess_batch,
+    radio_weights_path,
+)
+from .runtimes import exported_path
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff"}
+CHECK_BATCH_SIZE = 32
+
+
+def load_samples(
+    folder: Path, input_size: Tuple[int, int], limit: int
+) -> List[np.ndarray]:
+    """
+    Batches of one image, decoded and preprocessed the way the app does it.
+    """
+    paths = sorted(
+        path for path in folder.rglob("*") if path.suffix.lower() in IMAGE_EXTENSIONS
+    )[:limit]
+
+    samples = []
+    for path in paths:
+        image = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if image is None:
+            print(f"[WARNING] Couldn't read {path}, skipping it.")
+            continue
+
+        batch = np.expand_dims(prepare_image(image, input_size), axis=0)
+        samples.append(np.asarray(preprocess_batch(batch, input_size), np.float32))
+
+    if not samples:
+        raise ValueError(f"No images found in {folder}.")
+    return samples
+
+
+def traced_model(model: ConvolutionalModel):
+    import tensorflow as tf
+
+    network = model.model
+    signature = tf.TensorSpec((None, *network.input_shape[1:]), tf.float32, "images")
+    forward = tf.function(lambda images: network(images, training=False))
+    return forward, signature
+
+
+def export_onnx(
+    model: ConvolutionalModel,
+    weights_path: Path,
+    samples: Optional[List[np.ndarray]] = None,
+) -> List[Path]:
+    import tf2onnx
+
+    forward, signature = traced_model(model)
+    path = exported_path(weights_path, "onnx")
+    tf2onnx.convert.from_function(
+        forward, input_signature=(signature,), opset=17, output_path=str(path)
+    )
+    written = [path]
+
+    if samples is not None:
+        from onnxruntime.quantization import (
+            CalibrationDataReader,
+            QuantFormat,
+            QuantType,
+            quantize_static,
+        )
+
+        class Reader(CalibrationDataReader):
+            def __init__(self):
+                self.samples: Iterator[np.ndarray] = iter(samples)
+
+            def get_next(self):
+                sample = next(self.samples, None)
+                return None if sample is None else {signature.name: sample}
+
+        int8_path = exported_path(weights_path, "onnx", int8=True)
+        quantize_static(
+            str(path),
+            str(int8_path),
+            Reader(),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+        )
+        written.append(int8_path)
+
+    return written
+
+
+def export_tflite(
+    model: ConvolutionalModel,
+    weights_path: Path,
+    samples: Optional[List[np.ndarray]] = None,
+) -> List[Path]:
+    import tensorflow as tf
+
+    forward, signature = traced_model(model)
+    concrete = forward.get_concrete_function(signature)
+
+    def convert(int8: bool) -> Path:
+        converter = tf.lite.TFLiteConverter.from_concrete_functions(
+            [concrete], model.model
+        )
+        if int8:
+            # int8 weights and activations, the input and output stay float32.
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = lambda: ([s] for s in samples)
+
+        path = exported_path(weights_path, "tflite", int8)
+        path.write_bytes(converter.convert())
+        return path
+
+    written = [convert(False)]
+    if samples is not None:
+        written.append(convert(True))
+    return written
+
+
+EXPORTERS = {"onnx": export_onnx, "tflite": export_tflite}
+
+
+def run_in_chunks(model: ConvolutionalModel, samples: List[np.ndarray]) -> np.ndarray:
+    return np.concatenate(
+        [
+            model.run(np.concatenate(samples[i : i + CHECK_BATCH_SIZE]))
+            for i in range(0, len(samples), CHECK_BATCH_SIZE)
+        ]
+    )
+
+
+def check_parity(name: str, samples: List[np.ndarray], formats: List[str]):
+    """
+    Prints how often every exported version gives the Keras labels on `samples`,
+    and the largest difference in their raw outputs.
+    """
+    labeler = "match_labels_thresholded" if name == "pneumonia" else "match_labels"
+
+    reference = load_radio_model(name)
+    expected = run_in_chunks(reference, samples)
+    expected_labels = getattr(reference, labeler)(expected)
+
+    for backend in formats:
+        for int8 in (False, True):
+            if not exported_path(radio_weights_path(name), backend, int8).exists():
+                continue
+
+            model = load_radio_model(name, backend=backend, int8=int8)
+            output = run_in_chunks(model, samples)
+            labels = getattr(model, labeler)(output)
+            agree = sum(a == b for a, b in zip(labels, expected_labels))
+            print(
+                f"{name:<10}{backend + (' int8' if int8 else ''):<13}"
+                f"{agree:>5}/{len(samples):<5}{agree / len(samples):>8.1%}"
+                f"{np.abs(output - expected).max():>12.2e}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("models", nargs="*", default=list(RADIO_MODELS))
+    parser.add_argument("--format", nargs="+", default=["onnx"], choices=EXPORTERS)
+    parser.add_argument("--int8", action="store_true")
+    parser.add_argument("--calibration", type=Path)
+    parser.add_argument("--calibration-limit", type=int, default=200)
+    parser.add_argument("--check", type=Path)
+    parser.add_argument("--check-limit", type=int, default=1000)
+    parser.add_argument("--skip-export", action="store_true")
+    args = parser.parse_args()
+
+    if args.int8 and args.calibration is None:
+        parser.error("--int8 needs --calibration with a folder of sample images.")
+
+    for name in [] if args.skip_export else args.models:
+        model = load_radio_model(name)
+        samples = None
+        if args.int8:
+            samples = load_samples(
+                args.calibration, model.input_size, args.calibration_limit
+            )
+
+        for backend in args.format:
+            for path in EXPORTERS[backend](model, radio_weights_path(name), samples):
+                print(f"[INFO] Wrote {path}")
+
+    if args.check is not None:
+        print(f"{'model':<10}{'backend':<13}{'agree':>11}{'rate':>8}{'max diff':>12}")
+        for name in args.models:
+            samples = load_samples(args.check, RADIO_MODELS[name][2], args.check_limit)
+            check_parity(name, samples, args.format)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,56 @@
 import numpy as np
-from typing import List, Dict
-from service_streamer import ManagedModel, Streamer
+from typing import List, Dict, Optional, Sequence
+from service_streamer import ManagedModel
 from .model import (
     load_modality_model,
-    load_multiple_diseases_model,
+    load_diseases_heads,
     load_region_model,
-    load_pneumonia_model,
 )
-from ..internals import announce_start
+from ..internals import (
+    announce_start,
+    create_streamer,
+    limit_tf_threads,
+    EngineConfig,
+)
 from functools import lru_cache
 
 
+def inference_options(config: EngineConfig, traced: bool = False) -> Dict:
+    """
+    `init_model` arguments for the inference settings of `config`. `traced` is for
+    models that always run through a `tf.function`.
+    """
+    if traced:
+        config = config._replace(inference="function")
+
+    return {
+        "inference": config.inference,
+        "jit_compile": config.jit_compile,
+        "warmup_batch_sizes": config.warmup_sizes(),
+        "backend": config.backend,
+        "int8": config.int8,
+    }
+
+
 class ModalityModel(ManagedModel):
 
-    def init_model(self):
-        self.model = load_modality_model()
+    def init_model(
+        self,
+        intra_op_threads: Optional[int] = None,
+        inference: str = "predict",
+        jit_compile: bool = False,
+        warmup_batch_sizes: Sequence[int] = (),
+        backend: str = "keras",
+        int8: bool = False,
+    ):
+        if backend == "keras":
+            limit_tf_threads(intra_op_threads)
+        self.model = load_modality_model(
+            backend=backend, int8=int8, intra_op_threads=intra_op_threads
+        )
+        if inference == "function":
+            self.model.use_function(jit_compile)
+        self.model.warmup(warmup_batch_sizes)
 
     def predict(self, batch: List[np.ndarray]) -> List[Dict[str, bool]]:
         predictions = self.model.predict_by_list(batch)
@@ -23,17 +59,32 @@ class ModalityModel(ManagedModel):
 
 class MultipleDiseasesModel(ManagedModel):
 
-    def init_model(self):
-        self.main_model = load_multiple_diseases_model()
-        self.pneumonia_model = load_pneumonia_model()
+    def init_model(
+        self,
+        intra_op_threads: Optional[int] = None,
+        inference: str = "function",
+        jit_compile: bool = False,
+        warmup_batch_sizes: Sequence[int] = (),
+        backend: str = "keras",
+        int8: bool = False,
+    ):
+        if backend == "keras":
+            limit_tf_threads(intra_op_threads)
+        # The diseases and pneumonia networks share one preprocessing pass, and with
+        # Keras one traced graph, whatever `inference` says.
+        self.model = load_diseases_heads(
+            jit_compile, backend=backend, int8=int8, intra_op_threads=intra_op_threads
+        )
+        self.model.warmup(warmup_batch_sizes)
+        self.main_model = self.model.heads["diseases"]
+        self.pneumonia_model = self.model.heads["pneumonia"]
 
     def predict(self, batch: List[np.ndarray]) -> List[Dict[str, bool]]:
-        main_predictions = self.main_model.predict_by_list(batch)
-        main_predictions = self.main_model.match_labels(main_predictions)
+        predictions = self.model.predict_by_list(batch)
 
-        pneumonia_predictions = self.pneumonia_model.predict_by_list(batch)
+        main_predictions = self.main_model.match_labels(predictions["diseases"])
         pneumonia_predictions = self.pneumonia_model.match_labels_thresholded(
-            pneumonia_predictions
+            predictions["pneumonia"]
         )
 
         for i in range(len(main_predictions)):
@@ -46,8 +97,23 @@ class MultipleDiseasesModel(ManagedModel):
 
 class RegionModel(ManagedModel):
 
-    def init_model(self):
-        self.model = load_region_model()
+    def init_model(
+        self,
+        intra_op_threads: Optional[int] = None,
+        inference: str = "predict",
+        jit_compile: bool = False,
+        warmup_batch_sizes: Sequence[int] = (),
+        backend: str = "keras",
+        int8: bool = False,
+    ):
+        if backend == "keras":
+            limit_tf_threads(intra_op_threads)
+        self.model = load_region_model(
+            backend=backend, int8=int8, intra_op_threads=intra_op_threads
+        )
+        if inference == "function":
+            self.model.use_function(jit_compile)
+        self.model.warmup(warmup_batch_sizes)
 
     def predict(self, batch: List[np.ndarray]) -> List[Dict[str, bool]]:
         predictions = self.model.predict_by_list(batch)
@@ -56,19 +122,19 @@ class RegionModel(ManagedModel):
 
 @lru_cache(maxsize=1)
 @announce_start("Modality Classifier")
-def create_modality(cuda_devices, batch_size, max_latency, worker_num):
-    return Streamer(ModalityModel, batch_size, max_latency, worker_num, cuda_devices)
+def create_modality(config: EngineConfig):
+    return create_streamer(ModalityModel, config, **inference_options(config))
 
 
 @lru_cache(maxsize=1)
 @announce_start("Diseases Classifier")
-def create_diseases(cuda_devices, batch_size, max_latency, worker_num):
-    return Streamer(
-        MultipleDiseasesModel, batch_size, max_latency, worker_num, cuda_devices
+def create_diseases(config: EngineConfig):
+    return create_streamer(
+        MultipleDiseasesModel, config, **inference_options(config, traced=True)
     )
 
 
 @lru_cache(maxsize=1)
 @announce_start("Region Classifier")
-def create_region(cuda_devices, batch_size, max_latency, worker_num):
-    return Streamer(RegionModel, batch_size, max_latency, worker_num, cuda_devices)
+def create_region(config: EngineConfig):
+    return create_streamer(RegionModel, config, **inference_options(config))
@@ -1,9 +1,14 @@
+import cv2
 import numpy as np
-import tensorflow as tf
 import json
-from keras._tf_keras.keras.models import load_model
 from PIL import Image
-from typing import Tuple, List, Dict
+from scipy.special import softmax
+from typing import Tuple, List, Dict, Optional, Sequence
+from .runtimes import load_runtime_model
+
+DEFAULT_INPUT_SIZE = (224, 224)
+MODALITY_INPUT_SIZE = (112, 112)
+INPUT_SIZES = (DEFAULT_INPUT_SIZE, MODALITY_INPUT_SIZE)
 
 
 def load_image(image_path: str) -> np.ndarray:
@@ -15,8 +20,44 @@ def load_json(json_path: str) -> Dict:
         return json.load(file)
 
 
-def preprocess_batch(imgs: np.ndarray, img_size: Tuple[int, int]):
-    imgs = tf.image.resize(imgs, img_size)
+def resize_image(
+    image: np.ndarray, img_size: Tuple[int, int], use_tensorflow: bool = True
+) -> np.ndarray:
+    """
+    Bilinear resize of a single image to float32, with `tf.image.resize` or, when
+    `use_tensorflow` is off, OpenCV with the same interpolation (half-pixel
+    centers, no antialiasing). Only the "keras" backend uses TensorFlow, the
+    exported networks are fed without ever importing it.
+    """
+    if use_tensorflow:
+        import tensorflow as tf
+
+        return tf.image.resize(image, img_size).numpy()
+
+    resized = cv2.resize(
+        np.asarray(image, dtype=np.float32),
+        (img_size[1], img_size[0]),
+        interpolation=cv2.INTER_LINEAR,
+    )
+    # OpenCV drops a single channel axis.
+    return resized.reshape(*img_size, -1)
+
+
+def preprocess_batch(
+    imgs: np.ndarray, img_size: Tuple[int, int], use_tensorflow: bool = True
+):
+    if not use_tensorflow:
+        if tuple(imgs.shape[1:3]) != tuple(img_size):
+            imgs = np.stack([resize_image(img, img_size, False) for img in imgs])
+        if imgs.shape[-1] == 1:
+            imgs = np.repeat(imgs, 3, axis=-1)
+        return imgs / 255
+
+    import tensorflow as tf
+
+    # Images coming from `prepare_image` are already at the right size.
+    if tuple(imgs.shape[1:3]) != tuple(img_size):
+        imgs = tf.image.resize(imgs, img_size)
     if imgs.shape[-1] == 1:
         imgs = tf.expand_dims(imgs, axis=-1)
         imgs = tf.image.grayscale_to_rgb(imgs)
@@ -24,6 +65,30 @@ def preprocess_batch(imgs: np.ndarray, img_size: Tuple[int, int]):
     return imgs
 
 
+def prepare_image(
+    image: np.ndarray, img_size: Tuple[int, int], use_tensorflow: bool = True
+) -> np.ndarray:
+    """
+    Resizes a single image ahead of time, so every model sharing the same
+    input size can reuse it instead of resizing it again.
+    """
+    return resize_image(image, img_size, use_tensorflow)
+
+
+def prepare_for_models(
+    image: np.ndarray,
+    sizes: Tuple[Tuple[int, int], ...] = INPUT_SIZES,
+    use_tensorflow: bool = True,
+) -> Dict[Tuple[int, int], np.ndarray]:
+    return {size: prepare_image(image, size, use_tensorflow) for size in set(sizes)}
+
+
+def stack_batch(list_images: List[np.ndarray] | np.ndarray):
+    if isinstance(list_images, list):
+        return np.stack(list_images)
+    return np.expand_dims(list_images, axis=0)
+
+
 def set_max_true(batch):
     # Find the indices of the maximum values in each row
     max_indices = np.argmax(batch, axis=1)
@@ -38,17 +103,73 @@ def set_max_true(batch):
 
 
 class ConvolutionalModel:
-    def __init__(self, model_path: str, labels: Dict[int, str], input_size=(224, 224)):
-        self.model = load_model(model_path)
+    def __init__(
+        self,
+        model_path: str,
+        labels: Dict[int, str],
+        input_size=DEFAULT_INPUT_SIZE,
+        backend: str = "keras",
+        int8: bool = False,
+        intra_op_threads: Optional[int] = None,
+    ):
+        """
+        `backend` "onnx" and "tflite" run the version of `model_path` exported by
+        `python -m models.radio.export` (the int8 one with `int8`), without
+        TensorFlow. Only "keras" can be traced, retrained or saved.
+        """
+        self.backend = backend
+        self.use_tensorflow = backend == "keras"
+        if backend == "keras":
+            from keras._tf_keras.keras.models import load_model
+
+            self.model = load_model(model_path)
+        else:
+            self.model = load_runtime_model(model_path, backend, int8, intra_op_threads)
         self.input_size = input_size
         self.feedback_data = list()
         self.labels = labels.values()
+        self.forward = None
+
+    def use_function(self, jit_compile: bool = False):
+        """
+        Predicts through a `tf.function` called on the batch directly, skipping the
+        data adapter, callbacks and progress bar `model.predict` sets up on every
+        call. It's traced once per batch shape, with XLA when `jit_compile`.
+        """
+        if self.backend != "keras":
+            print(f"[WARNING] The {self.backend} backend can't be traced, ignoring.")
+            return
+
+        import tensorflow as tf
+
+        model = self.model
+
+        @tf.function(jit_compile=jit_compile)
+        def forward(images):
+            return model(images, training=False)
+
+        self.forward = forward
+
+    def run(self, images) -> np.ndarray:
+        if self.forward is None:
+            return self.model.predict(images)
+
+        import tensorflow as tf
+
+        return self.forward(tf.cast(images, tf.float32)).numpy()
+
+    def warmup(self, batch_sizes: Sequence[int]):
+        """
+        Runs a blank batch of every size, so no request pays for a trace or compile.
+        """
+        for batch_size in batch_sizes:
+            self.run(np.zeros((batch_size, *self.model.input_shape[1:]), np.float32))
 
     def get_qtd_classes(self):
         return self.model.layers[-1].units
 
     def raw_match_labels(self, logits: np.ndarray) -> Dict[str, float]:
-        per = tf.nn.softmax(logits)
+        per = softmax(logits, axis=-1)
         # Shape: (B, classes)
         return dict(zip(self.labels, per.tolist()))
 
@@ -66,13 +187,13 @@ class ConvolutionalModel:
 
     def predict_by_path(self, image_path: str) -> np.ndarray:
         image = load_image(image_path)
-        image = tf.expand_dims(image, axis=0)
-        image = preprocess_batch(image, self.input_size)
-        return self.model.predict(image)
+        image = np.expand_dims(image, axis=0)
+        image = preprocess_batch(image, self.input_size, self.use_tensorflow)
+        return self.run(image)
 
     def predict_by_img(self, image: np.ndarray) -> np.ndarray:
-        image = tf.expand_dims(image, axis=0)
-        return self.model.predict(image)
+        image = np.expand_dims(image, axis=0)
+        return self.run(image)
 
     def predict_by_list(self, list_images: List[np.ndarray] | np.ndarray) -> np.ndarray:
         """
@@ -80,19 +201,16 @@ class ConvolutionalModel:
         convertida em um batch e processada
         """
 
-        if isinstance(list_images, list):
-            list_images = np.stack(list_images)
-        else:
-            list_images = tf.expand_dims(list_images, axis=0)
-
-        list_images = preprocess_batch(list_images, self.input_size)
+        list_images = preprocess_batch(
+            stack_batch(list_images), self.input_size, self.use_tensorflow
+        )
 
-        return self.model.predict(list_images)
+        return self.run(list_images)
 
     def predict_by_array_np(self, array: np.ndarray) -> np.ndarray:
-        array = preprocess_batch(array, self.input_size)
+        array = preprocess_batch(array, self.input_size, self.use_tensorflow)
 
-        return self.model.predict(array)
+        return self.run(array)
 
     def store_feedback_by_path(self, image_path, true_label):
         """
@@ -123,6 +241,68 @@ class ConvolutionalModel:
         self.model.save(save_path)
 
 
+class MultiHeadModel:
+    """
+    Several `ConvolutionalModel`s taking the same input, run as one. The batch is
+    preprocessed once and every network runs inside the same traced graph, so a
+    batch costs a single dispatch however many heads there are. Exported heads
+    can't share a graph, they're run one after the other on the same batch.
+    """
+
+    def __init__(self, heads: Dict[str, ConvolutionalModel], jit_compile: bool = False):
+        sizes = {tuple(head.input_size) for head in heads.values()}
+        if len(sizes) != 1:
+            raise ValueError(
+                "Every head of a MultiHeadModel needs the same input size."
+            )
+
+        self.heads = heads
+        self.input_size = sizes.pop()
+        self.forward = None
+        self.use_tensorflow = all(head.use_tensorflow for head in heads.values())
+        if not self.use_tensorflow:
+            return
+
+        import tensorflow as tf
+
+        networks = {name: head.model for name, head in heads.items()}
+
+        # Traced once per batch size, see `warmup`.
+        @tf.function(jit_compile=jit_compile)
+        def forward(images):
+            return {
+                name: network(images, training=False)
+                for name, network in networks.items()
+            }
+
+        self.forward = forward
+
+    def predict_by_list(
+        self, list_images: List[np.ndarray] | np.ndarray
+    ) -> Dict[str, np.ndarray]:
+        """
+        The predictions of every head, by name.
+        """
+        images = preprocess_batch(
+            stack_batch(list_images), self.input_size, self.use_tensorflow
+        )
+        return self.run(images)
+
+    def run(self, images) -> Dict[str, np.ndarray]:
+        if self.forward is None:
+            return {name: head.run(images) for name, head in self.heads.items()}
+
+        import tensorflow as tf
+
+        outputs = self.forward(tf.cast(images, tf.float32))
+        return {name: output.numpy() for name, output in outputs.items()}
+
+    def warmup(self, batch_sizes: Sequence[int]):
+        shape = next(iter(self.heads.values())).model.input_shape[1:]
+        for batch_size in batch_sizes:
+            self.run(np.zeros((batch_size, *shape), np.float32))
+
+
 import pathlib
 
 _BASE_PATH = pathlib.Path(__file__).parent
@@ -130,21 +310,46 @@ _WEIGHTS_PATH = _BASE_PATH.joinpath("weights")
 
 labels = load_json(_WEIGHTS_PATH.joinpath("model_labels.json"))
 
-load_region_model = lambda: ConvolutionalModel(
-    _WEIGHTS_PATH.joinpath("region_xray_classification2version.h5"),
-    labels["region_xray_classification"],
-)
+# Weights file, labels entry and input size of every radiography network.
+RADIO_MODELS = {
+    "region": (
+        "region_xray_classification2version.h5",
+        "region_xray_classification",
+        DEFAULT_INPUT_SIZE,
+    ),
+    "pneumonia": ("pneumonia.keras", "pneumonia_model", DEFAULT_INPUT_SIZE),
+    "modality": ("modality_model2.keras", "modality_model", MODALITY_INPUT_SIZE),
+    "diseases": ("multiple_diseases.h5", "multiple_diseases", DEFAULT_INPUT_SIZE),
+}
 
-load_pneumonia_model = lambda: ConvolutionalModel(
-    _WEIGHTS_PATH.joinpath("pneumonia.keras"), labels["pneumonia_model"]
-)
 
-load_modality_model = lambda: ConvolutionalModel(
-    _WEIGHTS_PATH.joinpath("modality_model2.keras"),
-    labels["modality_model"],
-    (112, 112),
-)
+def radio_weights_path(name: str) -> pathlib.Path:
+    return _WEIGHTS_PATH.joinpath(RADIO_MODELS[name][0])
+
+
+def load_radio_model(name: str, **backend) -> ConvolutionalModel:
+    """
+    `backend` takes the `backend`, `int8` and `intra_op_threads` arguments of
+    `ConvolutionalModel`.
+    """
+    _, labels_key, input_size = RADIO_MODELS[name]
+    return ConvolutionalModel(
+        radio_weights_path(name), labels[labels_key], input_size, **backend
+    )
+
+
+load_region_model = lambda **backend: load_radio_model("region", **backend)
+
+load_pneumonia_model = lambda **backend: load_radio_model("pneumonia", **backend)
+
+load_modality_model = lambda **backend: load_radio_model("modality", **backend)
+
+load_multiple_diseases_model = lambda **backend: load_radio_model("diseases", **backend)
 
-load_multiple_diseases_model = lambda: ConvolutionalModel(
-    _WEIGHTS_PATH.joinpath("multiple_diseases.h5"), labels["multiple_diseases"]
+load_diseases_heads = lambda jit_compile=False, **backend: MultiHeadModel(
+    {
+        "diseases": load_multiple_diseases_model(**backend),
+        "pneumonia": load_pneumonia_model(**backend),
+    },
+    jit_compile,
 )
@@ -0,0 +1,100 @@
+import numpy as np
+from pathlib import Path
+from typing import Optional, Union
+
+BACKENDS = ("keras", "onnx", "tflite")
+EXTENSIONS = {"onnx": ".onnx", "tflite": ".tflite"}
+
+
+def exported_path(
+    weights_path: Union[Path, str], backend: str, int8: bool = False
+) -> Path:
+    """
+    Where `python -m models.radio.export` writes the `backend` version of a Keras
+    weights file, next to it: `pneumonia.keras` -> `pneumonia.int8.onnx`.
+    """
+    weights_path = Path(weights_path)
+    suffix = (".int8" if int8 else "") + EXTENSIONS[backend]
+    return weights_path.with_name(weights_path.stem + suffix)
+
+
+class OnnxModel:
+    """
+    Exported network run with ONNX Runtime on CPU. Quacks like the Keras model for
+    `predict` and `input_shape`, without importing TensorFlow.
+    """
+
+    def __init__(self, path: Union[Path, str], intra_op_threads: Optional[int] = None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if intra_op_threads is not None:
+            options.intra_op_num_threads = intra_op_threads
+
+        self.session = ort.InferenceSession(
+            str(path), options, providers=["CPUExecutionProvider"]
+        )
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Symbolic dimensions, like the batch, come back as strings.
+        self.input_shape = tuple(
+            dim if isinstance(dim, int) else None for dim in model_input.shape
+        )
+
+    def predict(self, images) -> np.ndarray:
+        images = np.asarray(images, dtype=np.float32)
+        return self.session.run(None, {self.input_name: images})[0]
+
+
+class TFLiteModel:
+    """
+    Exported network run with the TFLite interpreter, from `tflite_runtime` when
+    it's installed so TensorFlow isn't needed. The input is resized to every new
+    batch size.
+    """
+
+    def __init__(self, path: Union[Path, str], intra_op_threads: Optional[int] = None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        self.interpreter = Interpreter(
+            model_path=str(path), num_threads=intra_op_threads
+        )
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self.input_shape = (None, *self.interpreter.get_input_details()[0]["shape"][1:])
+        self.batch_size = None
+
+    def predict(self, images) -> np.ndarray:
+        images = np.asarray(images, dtype=np.float32)
+
+        if images.shape[0] != self.batch_size:
+            self.interpreter.resize_tensor_input(self.input_index, images.shape)
+            self.interpreter.allocate_tensors()
+            self.batch_size = images.shape[0]
+
+        self.interpreter.set_tensor(self.input_index, images)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_index).copy()
+
+
+def load_runtime_model(
+    weights_path: Union[Path, str],
+    backend: str,
+    int8: bool = False,
+    intra_op_threads: Optional[int] = None,
+):
+    if backend not in EXTENSIONS:
+        raise ValueError(f"Unknown backend: {backend}")
+
+    path = exported_path(weights_path, backend, int8)
+    if not path.exists():
+        raise FileNotFoundError(
+            f"{path} doesn't exist, export it with python -m models.radio.export."
+        )
+
+    if backend == "onnx":
+        return OnnxModel(path, intra_op_threads)
+    return TFLiteModel(path, intra_op_threads)
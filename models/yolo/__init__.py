@@ -1,3 +1,9 @@
-from .managed_models import create_fracture
+from .managed_models import create_fracture, FractureRequest
+from .base_predictor import DETECTOR_INPUT_SIZE, scale_detections
 
-__all__ = ["create_fracture"]
+__all__ = [
+    "create_fracture",
+    "FractureRequest",
+    "DETECTOR_INPUT_SIZE",
+    "scale_detections",
+]
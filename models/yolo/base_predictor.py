@@ -1,6 +1,10 @@
 from ultralytics import YOLO
 import numpy as np
-from typing import List, Tuple, Dict, Any, TypedDict
+from typing import List, Tuple, Dict, Any, TypedDict, Optional
+
+
+# Lado da imagem usada pelo YOLO (imgsz padrão do ultralytics)
+DETECTOR_INPUT_SIZE = 640
 
 
 class DetectorOutputFormat(TypedDict):
@@ -10,6 +14,42 @@ class DetectorOutputFormat(TypedDict):
     bbox: Tuple[int, int, int, int]
 
 
+class DetectionResult(TypedDict):
+    detections: List[DetectorOutputFormat]
+    # Só é preenchido quando a renderização é pedida
+    plot: Optional[np.ndarray]
+
+
+def format_detections(result) -> List[DetectorOutputFormat]:
+    image_detections = []
+
+    for box in result.boxes:
+        detection = {
+            "_class": result.names[int(box.cls)],
+            "confidence": float(box.conf),
+            # xywh: centro x, centro y, largura, altura
+            "bbox": box.xywh[0].tolist(),
+        }
+        image_detections.append(detection)
+
+    return image_detections
+
+
+def scale_detections(
+    detections: List[DetectorOutputFormat], scale: float
+) -> List[DetectorOutputFormat]:
+    """
+    Leva as caixas de uma imagem reduzida de volta para as coordenadas da original.
+    """
+    if scale == 1.0:
+        return detections
+
+    return [
+        {**detection, "bbox": [value * scale for value in detection["bbox"]]}
+        for detection in detections
+    ]
+
+
 class Detector:
 
     def __init__(self, model_path: str):
@@ -21,25 +61,32 @@ class Detector:
 
         results = self.model.predict(images, conf=conf)
 
-        batch_detections = []
+        return [format_detections(result) for result in results]
 
-        for result in results:
-            image_detections = []
-
-            for box in result.boxes:
-                detection = {
-                    "_class": result.names[int(box.cls)],
-                    "confidence": float(box.conf),
-                    # xywh: centro x, centro y, largura, altura
-                    "bbox": box.xywh[0].tolist(),
-                }
-                image_detections.append(detection)
+    def plot(self, images: List[np.ndarray], conf: float = 0.5) -> List[np.ndarray]:
+        results = self.model.predict(images, conf=conf)
 
-            batch_detections.append(image_detections)
+        return [result.plot() for result in results]
 
-        return batch_detections
+    def detect(
+        self,
+        images: List[np.ndarray],
+        conf: float = 0.5,
+        render: bool | List[bool] = False,
+    ) -> List[DetectionResult]:
+        """
+        Runs a single inference pass and returns the boxes of every image, plus the
+        rendered overlay for the images where `render` is set.
+        """
+        if isinstance(render, bool):
+            render = [render] * len(images)
 
-    def plot(self, images: List[np.ndarray], conf: float = 0.5) -> List[np.ndarray]:
         results = self.model.predict(images, conf=conf)
 
-        return [result.plot() for result in results]
+        return [
+            {
+                "detections": format_detections(result),
+                "plot": result.plot() if should_render else None,
+            }
+            for result, should_render in zip(results, render)
+        ]
@@ -1,9 +1,14 @@
 import numpy as np
-from typing import List, Dict
+from typing import List, Dict, Optional, NamedTuple
 from service_streamer import ManagedModel, Streamer
-from .base_predictor import DetectorOutputFormat
+from .base_predictor import DetectorOutputFormat, DetectionResult
 from .detectors import load_fracture_detector_model
-from ..internals import announce_start
+from ..internals import (
+    announce_start,
+    create_streamer,
+    limit_torch_threads,
+    EngineConfig,
+)
 from functools import lru_cache
 
 
@@ -26,19 +31,33 @@ if False:
         )
 
 
+class FractureRequest(NamedTuple):
+    image: np.ndarray
+    render: bool = False
+
+
 class FractureDetectorModel(ManagedModel):
 
-    def init_model(self):
+    def init_model(self, intra_op_threads: Optional[int] = None):
+        limit_torch_threads(intra_op_threads)
         self.model = load_fracture_detector_model()
 
-    def predict(self, batch: List[np.ndarray]) -> List[np.ndarray]:
-        predictions = self.model.plot(batch)
-        return predictions
+    def predict(
+        self, batch: List[FractureRequest | np.ndarray]
+    ) -> List[DetectionResult]:
+        # Plain arrays keep the old behaviour of always rendering the overlay.
+        requests = [
+            item if isinstance(item, FractureRequest) else FractureRequest(item, True)
+            for item in batch
+        ]
+
+        return self.model.detect(
+            [request.image for request in requests],
+            render=[request.render for request in requests],
+        )
 
 
 @lru_cache(maxsize=1)
 @announce_start("Fracture Region Classifier")
-def create_fracture(cuda_devices, batch_size, max_latency, worker_num):
-    return Streamer(
-        FractureDetectorModel, batch_size, max_latency, worker_num, cuda_devices
-    )
+def create_fracture(config: EngineConfig):
+    return create_streamer(FractureDetectorModel, config)
@@ -11,7 +11,7 @@ source venv/bin/activate
 echo "Activated virtual environment."
 
 echo "Installing dependencies"
-pip install -r requirements.txt
+pip install -r "${REQUIREMENTS:-requirements-keras.txt}"
 
 echo "Running uvicorn"
 uvicorn main:app --host 0.0.0.0 --port 80
@@ -24,11 +24,13 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- Variables ---
     let currentB64ImageFile = null; // Store the uploaded file reference
+    let currentImageFile = null; // The raw file, sent as is to the binary endpoints
 
     const modalityEndpoint = '/modalidade';
     const regionEndpoint = '/regiao';
     const diseasesEndpoint = '/raio-x-doencas';
     const fractureEndpoint = '/fracture';
+    const radiographyEndpoint = '/radiografia/upload';
     const completeReportEndpoint = "/completar-laudo";
     const generateReportEndpoint = "/gerar-laudo";
 
@@ -47,6 +49,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
             reader.onload = (e) => {
                 currentB64ImageFile = e.target.result.split(',')[1];
+                currentImageFile = file;
 
                 uploadedImage.src = e.target.result;
                 uploadedImage.style.display = 'block'; // Show the image element
@@ -54,7 +57,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
                 hidePlaceholder();
 
-                populateAnalysis(currentB64ImageFile);
+                populateAnalysis(currentB64ImageFile, currentImageFile);
             }
             reader.readAsDataURL(file);
 
@@ -145,6 +148,30 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    async function fetchRadiographyEndpoint(endpoint, imageFile, withFracture) {
+        const params = new URLSearchParams({ "fracture": withFracture });
+
+        try {
+            // The file goes as the raw body, skipping base64 and JSON parsing on the server.
+            const response = await fetch(`${endpoint}?${params}`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/octet-stream'
+                },
+                body: imageFile,
+                signal: AbortSignal.timeout(300000)
+            });
+
+            const data = await response.json();
+
+            return data;
+        } catch (error) {
+            console.warn(`While fetching from ${endpoint} an error happened!`);
+            console.warn(`The error: ${error.message}`);
+            return {};
+        }
+    }
+
     async function fetchCompleteEndpoint(endpoint, text, base64Image) {
         const body = JSON.stringify({
             "start": text,
@@ -207,6 +234,20 @@ document.addEventListener('DOMContentLoaded', () => {
         return "";
     }
 
+    function getSelectedLabel(data, endpoint) {
+        for (const [key, value] of Object.entries(data)) {
+            if (value) {
+                if (value === true) {
+                    return key;
+                } else {
+                    console.warn(`The endpoint ${endpoint} has probably changed! The output type was not expected!`);
+                }
+            }
+        }
+
+        return "";
+    }
+
     async function getAnalysisHeader(base64Image) {
         const [region, modality] = await Promise.all([
             getRegion(base64Image),
@@ -255,31 +296,43 @@ document.addEventListener('DOMContentLoaded', () => {
         unsetHidden(conditionsCard);
     }
 
+    // Single request: the server decodes the image once and runs every model on it.
+    async function createAnalysis(imageFile, analysisType) {
+        const withFracture = analysisType === 'fracture';
+        const output = await fetchRadiographyEndpoint(radiographyEndpoint, imageFile, withFracture);
+
+        populateHeader({
+            'region': getSelectedLabel(output.region || {}, radiographyEndpoint),
+            'modality': getSelectedLabel(output.modality || {}, radiographyEndpoint)
+        });
+
+        if (analysisType === 'general') {
+            populateCheckboxes(output.diseases || {});
+            unsetHidden(conditionsCard);
+        } else if (withFracture && output.fracture) {
+            const url = await drawDetections(uploadedImage.src, output.fracture.detections || []);
+            populateFracturePreview(url);
+            unsetHidden(regionsPreviewCard);
+        }
+    }
+
     async function createReport(base64Image) {
         let output = await getReport(base64Image);
         populateReport(output);
         unsetHidden(reportCard);
     }
 
-    async function populateAnalysis(base64Image) {
+    async function populateAnalysis(base64Image, imageFile) {
         let analysisType = getSelectedAnalysisType();
 
         resetAIOutputs();
         setLoadingState(true);
 
         let promises = [
-            createHeader(base64Image),
+            createAnalysis(imageFile, analysisType),
             createReport(base64Image)
         ]
 
-        if (analysisType === 'general') {
-            promises.push(createCheckboxes(base64Image));
-        } else if (analysisType === 'mammography') {
-
-        } else if (analysisType === 'fracture') {
-            promises.push(createFractureImagePreview(base64Image));
-        }
-
         await Promise.all(promises);
 
         setLoadingState(false);
@@ -287,6 +340,40 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- UI Helper Functions ---
 
+    // Draws the detector boxes (center x, center y, width, height) over the uploaded image.
+    function drawDetections(imageSrc, detections) {
+        return new Promise((resolve) => {
+            const image = new Image();
+            image.onload = () => {
+                const canvas = document.createElement('canvas');
+                canvas.width = image.naturalWidth;
+                canvas.height = image.naturalHeight;
+
+                const context = canvas.getContext('2d');
+                context.drawImage(image, 0, 0);
+
+                const lineWidth = Math.max(2, Math.round(canvas.width / 300));
+                context.lineWidth = lineWidth;
+                context.strokeStyle = '#ff3838';
+                context.fillStyle = '#ff3838';
+                context.font = `${lineWidth * 8}px sans-serif`;
+                context.textBaseline = 'bottom';
+
+                for (const detection of detections) {
+                    const [cx, cy, width, height] = detection.bbox;
+                    const x = cx - width / 2;
+                    const y = cy - height / 2;
+
+                    context.strokeRect(x, y, width, height);
+                    context.fillText(`${detection._class} ${detection.confidence.toFixed(2)}`, x, y - lineWidth);
+                }
+
+                resolve(canvas.toDataURL('image/png'));
+            };
+            image.src = imageSrc;
+        });
+    }
+
     function setHidden(element) {
         element.classList.add('hidden');
     }
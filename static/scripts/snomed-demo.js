@@ -34,7 +34,7 @@ async function processText() {
 
     let textToProcess = inputText;
 
-    const { text, medicalTerms } = await getSoapAndEntities(textToProcess, useSoap)
+    const { text, medicalTerms } = await streamSoapAndEntities(textToProcess, useSoap)
     const entities = extractEntities(text, medicalTerms);
     processedEntities = entities;
     displayAnnotatedText(text, entities);
@@ -61,6 +61,73 @@ async function getSoapAndEntities(text, useSoap) {
     }
 }
 
+// Renders the partial results of /index/stream while the pipeline runs.
+function displayProgress(text, status) {
+    const annotatedTab = document.getElementById('annotatedTab');
+    const container = document.createElement('div');
+    container.style.cssText = 'color: #c7d2fe; line-height: 1.8; white-space: pre-wrap;';
+    container.textContent = text;
+
+    const statusLine = document.createElement('div');
+    statusLine.style.cssText = 'color: #818cf8; font-size: 12px; margin-top: 8px;';
+    statusLine.textContent = status;
+
+    annotatedTab.replaceChildren(container, statusLine);
+}
+
+async function streamSoapAndEntities(text, useSoap) {
+    try {
+        const response = await fetch("/index/stream", {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ text: text, use_soap: useSoap })
+        });
+
+        if (!response.ok || !response.body) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let pending = '';
+        let soapText = '';
+        let shownText = useSoap ? '' : text;
+
+        displayProgress(shownText, useSoap ? 'Generating SOAP note...' : 'Translating...');
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+
+            pending += decoder.decode(value, { stream: true });
+            const lines = pending.split('\n');
+            pending = lines.pop();
+
+            for (const line of lines) {
+                if (!line.trim()) continue;
+                const event = JSON.parse(line);
+
+                if (event.event === 'error') {
+                    throw new Error(event.detail);
+                } else if (event.event === 'done') {
+                    return { 'text': event.text, 'medicalTerms': event.medicalTerms };
+                } else if (event.stage === 'soap') {
+                    soapText = event.event === 'delta' ? soapText + event.text : event.text;
+                    shownText = soapText;
+                    displayProgress(shownText, event.event === 'delta' ? 'Generating SOAP note...' : 'Translating...');
+                } else if (event.stage === 'translation' && event.event === 'stage') {
+                    displayProgress(shownText, 'Finding medical terms...');
+                }
+            }
+        }
+
+        throw new Error("The stream ended before the results.");
+    } catch (error) {
+        console.error("Streaming failed, falling back to /index:", error);
+        return await getSoapAndEntities(text, useSoap);
+    }
+}
+
 function fuse_entities(indexedList) {
     let entities = [];
     let processed = new Set();
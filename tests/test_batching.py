@@ -0,0 +1,64 @@
+import asyncio
+from models.indexer import batching
+from models.indexer.batching import CTakesBatcher
+
+
+def test_batches_wait_for_a_run_slot(monkeypatch):
+    """
+    While a slow run holds the only slot, two bursts of texts arrive more than
+    `max_latency` apart. They must end up in a single next batch, not in one
+    batch each queued behind the slot.
+    """
+    runs = []
+    first_run_may_finish = None
+
+    async def fake_index_texts(texts, *args, **kwargs):
+        runs.append(list(texts))
+        if len(runs) == 1:
+            await first_run_may_finish.wait()
+        return {i: {text: []} for i, text in enumerate(texts)}
+
+    monkeypatch.setattr(batching, "index_texts", fake_index_texts)
+
+    async def scenario():
+        nonlocal first_run_may_finish
+        first_run_may_finish = asyncio.Event()
+        batcher = CTakesBatcher("ctakes", "key", max_batch_size=8, max_latency=0.01)
+
+        first = asyncio.ensure_future(batcher.index("a"))
+        await asyncio.sleep(0.05)
+        assert runs == [["a"]]
+
+        second = [asyncio.ensure_future(batcher.index(t)) for t in ("b", "c")]
+        await asyncio.sleep(0.05)
+        third = [asyncio.ensure_future(batcher.index(t)) for t in ("d", "e")]
+        await asyncio.sleep(0.05)
+        assert runs == [["a"]]
+
+        first_run_may_finish.set()
+        results = await asyncio.gather(first, *second, *third)
+
+        assert runs == [["a"], ["b", "c", "d", "e"]]
+        assert results == [{text: []} for text in "abcde"]
+
+    asyncio.run(scenario())
+
+
+def test_overflow_goes_to_the_next_slot(monkeypatch):
+    runs = []
+
+    async def fake_index_texts(texts, *args, **kwargs):
+        runs.append(list(texts))
+        await asyncio.sleep(0.01)
+        return {i: {text: []} for i, text in enumerate(texts)}
+
+    monkeypatch.setattr(batching, "index_texts", fake_index_texts)
+
+    async def scenario():
+        batcher = CTakesBatcher("ctakes", "key", max_batch_size=2, max_latency=0.01)
+        return await batcher.index_many(["a", "b", "c", "d", "e"])
+
+    indexed = asyncio.run(scenario())
+
+    assert runs == [["a", "b"], ["c", "d"], ["e"]]
+    assert indexed == {i: {text: []} for i, text in enumerate("abcde")}